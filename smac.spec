@@ -0,0 +1,31 @@
+# -*- mode: python ; coding: utf-8 -*-
+# One PyInstaller bundle for both clickers:
+#
+#     python -m smac.bundle
+#     pyinstaller smac.spec
+#     dist/smac/smac.exe money
+#
+# Tasks are imported by name once selected, so PyInstaller has to be told about them.
+# The template bundles compiled by smac.bundle are shipped with the resources and memory-mapped at startup.
+
+a = Analysis(
+    ['smac/__main__.py'],
+    pathex=['.'],
+    datas=[
+        ('SM-Money-Clicker/src/resources', 'SM-Money-Clicker/src/resources'),
+        ('SM-Token-Clicker/src/resources', 'SM-Token-Clicker/src/resources'),
+    ],
+    hiddenimports=['smac.tasks.money', 'smac.tasks.token'],
+    excludes=['smac.benchmark'],
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='smac',
+    console=True,
+)
+coll = COLLECT(exe, a.binaries, a.datas, name='smac')
@@ -0,0 +1,70 @@
+# Author: Kyle Mathias
+
+# Runs one of the clicker's tasks, or with --schedule several of them, each whenever it can be played:
+#
+#     python -m smac money [--replay frames.npz] [--workers workers.json] ...
+#     python -m smac money token --schedule
+#
+# This is also the entry point of the PyInstaller bundle (see smac.spec), which runs either task the same way.
+
+import argparse
+import asyncio
+import functools
+import multiprocessing
+import sys
+from smac import log
+from smac.tasks import TASKS, load_task
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='smac', description="Super Mechs clicker")
+    parser.add_argument('task', nargs='+', choices=sorted(TASKS), help="what to play the game for")
+    parser.add_argument('--schedule', action='store_true',
+                        help="Keep playing the tasks, each once it has refilled, instead of exiting when one is done")
+    parser.add_argument('--workers', help="JSON file describing several workers to run side by side")
+    parser.add_argument('--replay', help="Play back recorded frames (PNG directory or .npz) instead of the screen")
+    parser.add_argument('--record', help="Directory to save every captured frame to")
+    parser.add_argument('--clicks-log', help="Log clicks to this JSONL file instead of clicking")
+    parser.add_argument('--events', help="Write timing events (captures, matches, clicks, states) to this JSONL file")
+    parser.add_argument('--stats', help="Statistics store to add this run to (live runs default to ~/.smac/stats.sqlite3)")
+    parser.add_argument('--log-level', choices=list(log.LEVELS), default='info', help="Least important messages to print")
+    args = parser.parse_args(argv)
+    if len(args.task) > 1 and not args.schedule:
+        parser.error("several tasks can only be played with --schedule")
+    if args.schedule and (args.workers or args.replay):
+        parser.error("--schedule cannot be combined with --workers or --replay")
+    log.configure(args.events, log.LEVELS[args.log_level])
+
+    if args.schedule:
+        # The scheduler only sleeps and starts processes, each task process imports what it needs itself
+        from smac.scheduler import run_schedule, run_task
+        run_schedule(args.task, functools.partial(run_task, events_path=args.events, log_level=log.LEVELS[args.log_level],
+                                                  stats_path=args.stats))
+        return
+
+    # Only the selected task, and the parts of the engine it uses, are imported
+    task = load_task(args.task[0])
+    from smac import app
+    from smac.capture import ReplayFinished
+    from smac.templates import is_bundled, load_templates
+
+    if args.workers:
+        from smac.supervisor import load_worker_configs, supervise
+        registry = load_templates(task.RESOURCES_DIR)
+        # Workers map a compiled bundle themselves, sharing its pages, rather than each getting a copy of it
+        supervise(functools.partial(app.run_worker, args.task[0]), load_worker_configs(args.workers),
+                  None if is_bundled() else registry)
+        return
+
+    try:
+        stats_path = args.stats or (None if args.replay else app.STATS_PATH)  # Replays are only stored when asked to
+        asyncio.run(app.run(task, replay=args.replay, record=args.record, clicks_log=args.clicks_log, stats_path=stats_path))
+    except ReplayFinished:
+        log.info("Replay finished after %d click(s).", len(app.input_device.clicks))
+    finally:
+        log.close()
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Needed for worker processes in the PyInstaller build
+    main(sys.argv[1:])
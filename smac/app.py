@@ -0,0 +1,318 @@
+# Author: Kyle Mathias
+
+# The part of the clicker every task shares: finding and clicking buttons, starting the game and running a task's
+# state machine on it until the task is done. A task is a module in smac.tasks (see smac.tasks for what it defines).
+
+import asyncio
+import os
+import time
+from . import calibration, clock, log, masks, runtime, scheduler, stats
+from .templates import TEMPLATES, get_template, install_templates, load_templates
+from .capture import FrameRecorder, ReplayCapture, ScreenCapture
+from .inputs import FakeInput, PyAutoGuiInput
+from .matching import load_location_cache, match_all, match_template, set_anchors, set_match_mode
+from .waiting import poll, wait_change, wait_for, wait_stable
+from .states import StateMachine
+from .watchdog import EXIT_GAVE_UP, MAX_FAILED_RESTARTS, Durations
+from .runtime import FrameStream, act, in_capture_thread, in_match_thread
+
+APP_NAME = "Super Mechs.exe"
+
+USER_DIR = os.path.expanduser("~")  # Get the user's home directory
+APP_PATH = os.path.join(USER_DIR, "AppData", "Local", "SuperMechs", APP_NAME)
+CACHE_DIR = os.path.join(USER_DIR, ".smac")  # Data kept between runs
+STATS_PATH = os.path.join(CACHE_DIR, "stats.sqlite3")  # Statistics store of live runs, see smac.stats
+
+# Task module being run, set up in run()
+task = None
+
+# Stream of screen frames shared by every lookup and the device clicks go to, set up in run()
+stream = None
+input_device = None
+headless = False  # Replaying recorded frames, with no game to start or stop
+
+# Set when running as one of several workers under the supervisor
+worker_name = None
+events = None  # Queue the supervisor counts (worker name, event) tuples from
+click_lock = None  # Lock shared by the workers so only one of them clicks at a time
+game = None  # Game process this clicker started, set up in run()
+
+# State machine driving the game, set up in run()
+machine = None
+
+# Times a click the screen shows no reaction to is made again, and how long the screen usually takes to react
+# to each button, by label (set up in run())
+CLICK_RETRIES = 2
+CLICK_MIN_WAIT = 1.0  # Seconds a click is always given to show a reaction
+latencies = Durations(min_limit=CLICK_MIN_WAIT)
+
+# Events reported so far, a restart after which none were reported did not get the game going again
+reports = 0
+
+
+# Function to find the center of an image on the screen
+async def find_image(image_path, threshold = 0.8):
+    template = get_template(image_path)
+    if template is None:
+        return None
+
+    log.debug("Capturing screen...")
+    screen_img = await stream.next()
+
+    # Apply template Matching
+    match = await in_match_thread(match_template, screen_img, template, threshold)
+    log.debug("Template matching completed.")
+
+    if match:
+        log.debug("Image found at coordinates: (%d, %d)", match.x, match.y)
+        return match.x, match.y
+
+    log.debug("Image not found: %s", image_path)
+    return None
+
+
+# Function to find the centers of every occurrence of an image on the last captured frame, best first
+async def find_all(image_path, threshold = 0.8):
+    template = get_template(image_path)
+    if template is None:
+        return []
+
+    matches = await in_match_thread(match_all, stream.frame, template, threshold)
+    log.debug("%d occurrence(s) of %s found.", len(matches), os.path.basename(image_path))
+    return [(match.x, match.y) for match in matches]
+
+
+# Function to wait until an image is on the screen and return its center
+async def wait_for_image(image_path, timeout, threshold = 0.8):
+    match = await wait_for(stream, image_path, timeout, threshold=threshold)
+    if match:
+        log.debug("Image found at coordinates: (%d, %d)", match.x, match.y)
+        return match.x, match.y
+
+    log.info("Image not found after %ss: %s", timeout, image_path)
+    return None
+
+
+# Function to click a position of the captured frame on the real screen
+async def tap(coords):
+    x, y = coords[0] + stream.left, coords[1] + stream.top
+    started = time.perf_counter()
+    await act(press, x, y)
+    # How long the click itself took, including waiting for other workers, and how old the frame it was decided on is
+    log.timing('click', None, time.perf_counter() - started, x=x, y=y,
+               frame_age_ms=round((clock.now() - stream.grabbed_at) * 1000, 1) if stream.grabbed_at else None)
+
+
+# Function to click a position on the real screen, one worker at a time
+def press(x, y):
+    if click_lock is None:
+        input_device.click(x, y)
+        return
+    with click_lock:
+        input_device.click(x, y)
+
+
+# Function to tell the supervisor about a finished battle, reward, etc.
+def report(event):
+    global reports
+    reports += 1
+    log.event('report', name=event)
+    stats.outcome(event)
+    if event == task.CYCLE_EVENT:
+        end_cycle(event)
+    if events is not None:
+        events.put((worker_name, event))
+
+
+def end_cycle(label):
+    """ Close the current cycle (a battle, an ad) and store it with the events reported during it. """
+    finished = log.cycle(label)
+    if finished:
+        stats.cycle(label, *finished)
+
+
+async def open_game():
+    """ Start the game, closing the copy this clicker started before. """
+    if not headless:
+        await asyncio.to_thread(game.start)
+
+
+async def close_game():
+    """ Close the game this clicker is playing, without touching other workers' games. """
+    if not headless:
+        await asyncio.to_thread(game.stop)
+
+
+async def click(coords, label, delay, retry=True):
+    """
+    Click a detected button and wait for the screen around it to react, then for the screen to settle, for at
+    most delay seconds. A click the button shows no reaction to in the time it usually takes (all of delay until
+    that is known, and never less than CLICK_MIN_WAIT) is made again, up to CLICK_RETRIES times, unless retry is False: a toggle such as AUTO would
+    only be switched back if the first click was just slow to show.
+    """
+    log.info("%s detected.", label)
+    for attempt in range(CLICK_RETRIES + 1 if retry else 1):
+        reference = stream.frame
+        await tap(coords)
+        latency = await wait_change(stream, reference, max(CLICK_MIN_WAIT, latencies.limit(label, delay)), around=coords)
+        if latency is not None:
+            latencies.add(label, latency)
+            await wait_stable(stream, delay - latency)
+            return
+        if retry and attempt < CLICK_RETRIES:
+            log.warning("No reaction to %s, clicking again.", label)
+            log.event('retry', name=label)
+    log.warning("No reaction to %s.", label)
+
+
+def coords_of(matches):
+    """ Center of the first match of a state. """
+    match = next(iter(matches.values()))
+    return match.x, match.y
+
+
+def clicker(label, delay, retry=True):
+    """ Handler that clicks the state's button. """
+    return lambda matches: click(coords_of(matches), label, delay, retry)
+
+
+def cache_path(kind):
+    """ Path of a file the task keeps between runs, e.g. its location cache, with one per worker. """
+    name = f"{task.NAME}-{worker_name}-{kind}" if worker_name else f"{task.NAME}-{kind}"
+    return os.path.join(CACHE_DIR, name)
+
+
+async def run(task_module, monitor=1, region=None, app_path=APP_PATH, replay=None, record=None, clicks_log=None,
+              stats_path=None):
+    """
+    Play the game with a task until it is done, and return why it is. With replay, frames come from a recording (a PNG directory
+    or .npz file) on virtual time and clicks are only logged, so the whole flow runs without a desktop.
+    With record, every captured frame is also saved as a PNG for later replay. Cycles, outcomes and restarts
+    are added to the statistics store at stats_path.
+    """
+    global task, stream, input_device, headless, game, machine, latencies
+    task = task_module
+    if not TEMPLATES:
+        load_templates(task.RESOURCES_DIR)  # Decode every template once up front
+
+    if replay:
+        headless = True
+        clock.use_virtual_time()
+        capture = ReplayCapture(replay)
+        input_device = FakeInput(clicks_log)
+    else:
+        # Keep one capture session open for the whole run, on the thread every grab will be made from
+        capture = await in_capture_thread(ScreenCapture, monitor, region)
+        input_device = FakeInput(clicks_log) if clicks_log else PyAutoGuiInput()
+    if record:
+        capture = FrameRecorder(capture, record)
+    if not headless:
+        from .game import Game  # Only a live run has a game process to look after
+        game = Game(app_path, APP_NAME, cache_path("game.json"))
+        if worker_name is None:
+            game.stop_all()  # A single clicker also closes a copy of the game that was opened by hand
+    # What a run learns is kept in CACHE_DIR for later runs, except what a replay learns: its recording may be
+    # of another resolution or game scale than the live game, and it runs on virtual time
+    # Search where each button was last seen first, with one cache per worker since their regions differ
+    load_location_cache(None if replay else cache_path("locations.json"))
+    # Templates resized to the scale the game is drawn at are shared by the workers, per resolution
+    calibration.use_cache(None if replay else os.path.join(CACHE_DIR, f"{task.NAME}-templates"))
+    for scale, image_paths in task.MATCH_MODES:
+        for image_path in image_paths:
+            set_match_mode(image_path, scale, gray=True)
+    # Screens with changing content are compared on the pixels that stay the same, and found from a few patches
+    masks.use_cache(None if replay else os.path.join(CACHE_DIR, f"{task.NAME}-masks"))
+    for image_path in task.DYNAMIC_IMAGES:
+        masks.learn_mask(image_path)
+        set_anchors(image_path)
+    stream = FrameStream(capture, live=not replay)
+    # How long each state usually takes to move on, and the screen to react to each button
+    durations = Durations(None if replay else os.path.join(CACHE_DIR, f"{task.NAME}-durations.json"))
+    latencies = Durations(None if replay else os.path.join(CACHE_DIR, f"{task.NAME}-latencies.json"), CLICK_MIN_WAIT)
+    machine = StateMachine(stream, task.STATES, popups=task.POPUPS, back=task.BACK, durations=durations)
+    stats.start_run(stats_path, task.NAME, worker_name)
+    await stream.start()
+    try:
+        return await play(app_path)
+    finally:
+        await stream.stop()
+        latencies.save()
+        stats.end_run('stopped')  # Unless play() already recorded why the run ended
+
+
+async def wait_until_loaded(timeout):
+    """
+    Wait for one of the task's first screens and return its path, or None on timeout. Until the scale the game
+    is drawn at is known for the frame resolution, frames without any of them are also searched for the task's
+    calibration screens at every scale, and the templates are resized to the scale one is found at.
+    """
+    async for _ in poll(timeout, 1.0):
+        frame = await stream.next()
+        known = calibration.prepare(frame)
+        matches = await runtime.match(frame, task.START_IMAGES)
+        for image_path in task.START_IMAGES:
+            if matches[image_path]:
+                calibration.confirm(frame)
+                log.info("%s found at coordinates: (%d, %d)", os.path.basename(image_path), matches[image_path].x, matches[image_path].y)
+                return image_path
+        if not known:
+            await in_match_thread(calibration.calibrate, frame, task.CALIBRATION_IMAGES)
+
+    # The game may be drawn at another scale than the one found before, e.g. after its window was resized
+    calibration.forget()
+    return None
+
+
+async def play(app_path):
+    """
+    Start the game and run the state machine on it, restarting the game whenever it gets stuck. Once the task is
+    done, closes the game, notes when the task can be played again and returns the reason. If the game keeps
+    getting stuck without anything being reported, gives up and exits with an error for someone to have a look.
+    """
+    failed_restarts = 0
+    while True:
+        reported = reports
+        started = clock.now()
+        await open_game()
+        # The game is ready as soon as the first frame shows one of its first screens
+        image_path = await wait_until_loaded(60)
+        if image_path is None and not headless and not game.is_running():
+            # A game that crashes on launch counts as a failed restart, so it ends in the alert too
+            log.warning("The application exited while loading.")
+            reason = 'load'
+        else:
+            log.timing('game load', None, clock.now() - started)
+            log.start_cycle()  # The first cycle runs from the first load, later loads are part of the cycle they happen in
+
+            # Run the task from whatever screen the game is on until it is done or gets stuck
+            reason = await machine.run()
+            if reason in task.DONE_REASONS:
+                stats.end_run(reason)
+                if not headless:
+                    scheduler.record(scheduler.SCHEDULE_PATH, task.NAME, reason, task.REFILL.get(reason))
+                await close_game()
+                return reason
+        stats.restart(reason)
+        failed_restarts = failed_restarts + 1 if reports == reported else 0
+        if failed_restarts >= MAX_FAILED_RESTARTS:
+            log.error("Stuck %d times in a row without progress (%s), giving up.", failed_restarts, reason)
+            log.event('watchdog', step='alert', reason=reason, restarts=failed_restarts)
+            stats.end_run('alert')
+            await close_game()
+            exit(EXIT_GAVE_UP)
+        log.warning("Restarting the application (%s).", reason)
+
+
+def run_worker(task_name, config, registry, worker_events, worker_click_lock):
+    """ Entry point of a worker process started by the supervisor. """
+    global worker_name, events, click_lock
+    from .tasks import load_task
+    task_module = load_task(task_name)
+    worker_name, events, click_lock = config['name'], worker_events, worker_click_lock
+    log.configure(config.get('events'), log.LEVELS[config.get('log_level', 'info')], worker_name)
+    install_templates(registry, task_module.RESOURCES_DIR)  # Reuse the templates the supervisor already loaded
+    try:
+        asyncio.run(run(task_module, config.get('monitor', 1), config.get('region'), config.get('app_path', APP_PATH),
+                        stats_path=config.get('stats', STATS_PATH)))
+    finally:
+        log.close()
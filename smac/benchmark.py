@@ -0,0 +1,211 @@
+# Author: Kyle Mathias
+
+# Measures how fast and how accurately each template is found on a corpus of screen captures:
+#
+#     python -m smac.benchmark TASK CORPUS [--labels labels.json] [--output results.json]
+#
+# CORPUS is a directory of PNG captures (as written by python -m smac TASK --record) or an .npz file with a 'frames'
+# array. The labels file maps a frame (its file name, or its index for an .npz) to the templates visible
+# on it, either as a list of template names or as a dict of template name -> [x, y] centre:
+#
+#     {"000012.png": ["buttons/teams"], "000013.png": {"buttons/smac-money": [412, 388]}}
+#
+# Frames without labels only count towards latency. Every template of the task is timed with every strategy in
+# STRATEGIES and the results are written as JSON, so runs before and after a matcher change can be compared.
+
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+from . import log, matching
+from .capture import ReplayCapture, ReplayFinished
+from .tasks import TASKS, load_task
+from .templates import load_templates
+
+# Matching strategies as (scale, gray, roi): scale below 1 searches a downscaled frame first and
+# verifies candidates at full resolution, gray does that search in grayscale, and roi only searches
+# around the template's known location, as the location cache does
+STRATEGIES = {
+    'full': (1.0, False, False),
+    'roi': (1.0, False, True),
+    'pyramid': (0.5, False, False),
+    'gray': (0.25, True, False),
+}
+
+# Threshold of the templates the task does not list in its THRESHOLDS
+DEFAULT_THRESHOLD = 0.8
+
+# Template folders that are benchmarked
+TEMPLATE_DIRS = ('buttons', 'screens')
+
+
+def load_corpus(path):
+    """ Read every frame of a corpus. Returns a list of (key, BGRA frame), keyed like the labels file. """
+    replay = ReplayCapture(path)
+    keys = [os.path.basename(file) for file in replay.files] if replay.files is not None else None
+
+    frames = []
+    try:
+        while True:
+            frame = replay.grab()
+            frames.append((keys[replay.index - 1] if keys else str(replay.index - 1), frame))
+    except ReplayFinished:
+        pass
+    return frames
+
+
+def load_labels(path):
+    """ Read a labels file into key -> {template name: [x, y] or None}. """
+    with open(path) as f:
+        raw = json.load(f)
+
+    labels = {}
+    for key, visible in raw.items():
+        if isinstance(visible, dict):
+            labels[str(key)] = {name.lower(): location for name, location in visible.items()}
+        else:
+            labels[str(key)] = dict.fromkeys((name.lower() for name in visible), None)
+    return labels
+
+
+def find(frame, template, threshold, strategy, location=None):
+    """ Run one strategy on a frame. Returns (score, centre) of the best candidate, centre None if there is none. """
+    scale, gray, roi = STRATEGIES[strategy]
+    frame_h, frame_w = frame.shape[:2]
+    left, top, right, bottom = 0, 0, frame_w, frame_h
+    if roi and location:
+        margin = matching.CACHE_MARGIN
+        x, y = location[0] - template.w // 2, location[1] - template.h // 2
+        left, top, right, bottom = x - margin, y - margin, x + template.w + margin, y + template.h + margin
+
+    if scale < 1:
+        matching._pyramid_frame = None  # Time the frame downscale too, as when a single template is matched
+        score, top_left = matching._pyramid_match_in(frame, template, left, top, right, bottom, threshold, scale, gray)
+    else:
+        score, top_left = matching._match_in(frame, template, left, top, right, bottom)
+
+    if top_left is None:
+        return score, None
+    return score, (top_left[0] + template.w // 2, top_left[1] + template.h // 2)
+
+
+def percentiles(times):
+    p50, p95, p99 = np.percentile(times, [50, 95, 99]) * 1000
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+
+
+def ratio(a, b):
+    return round(a / b, 4) if b else None
+
+
+def benchmark_template(frames, labels, template, threshold, strategy, repeat, locations):
+    """ Time one template with one strategy over every frame and score its detections against the labels. """
+    times = []
+    counts = dict.fromkeys(('tp', 'fp', 'fn', 'tn'), 0)
+    positive_scores, negative_scores = [], []
+
+    for key, frame in frames:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            score, centre = find(frame, template, threshold, strategy, locations.get(template.name))
+            times.append(time.perf_counter() - start)
+
+        found = centre is not None and score >= threshold
+        if found and strategy == 'full':
+            locations.setdefault(template.name, centre)  # ROI searches around the first full frame find
+
+        if key not in labels:
+            continue
+        visible = template.name in labels[key]
+        (positive_scores if visible else negative_scores).append(score)
+
+        expected = labels[key].get(template.name)
+        if found and expected and max(abs(centre[0] - expected[0]), abs(centre[1] - expected[1])) > max(template.w, template.h) // 2:
+            counts['fp'] += 1  # Found, but somewhere else than where it is
+            counts['fn'] += 1
+        elif found:
+            counts['tp' if visible else 'fp'] += 1
+        else:
+            counts['fn' if visible else 'tn'] += 1
+
+    result = {'threshold': threshold, **percentiles(times), **counts,
+              'precision': ratio(counts['tp'], counts['tp'] + counts['fp']),
+              'recall': ratio(counts['tp'], counts['tp'] + counts['fn']),
+              # How close the template comes to misfiring: its weakest hit and its strongest miss
+              'min_positive_score': round(min(positive_scores), 4) if positive_scores else None,
+              'max_negative_score': round(max(negative_scores), 4) if negative_scores else None}
+    return result, times
+
+
+def run_benchmark(frames, labels, templates, thresholds, strategies, repeat=3):
+    """ Benchmark every template with every strategy. Returns the JSON-ready results. """
+    locations = {}
+    for key, visible in labels.items():
+        for name, location in visible.items():
+            if location:
+                locations.setdefault(name, tuple(location))
+
+    results = {}
+    for strategy in strategies:
+        per_template = {}
+        all_times = []
+        totals = dict.fromkeys(('tp', 'fp', 'fn', 'tn'), 0)
+        for template in templates:
+            threshold = thresholds.get(template.name, DEFAULT_THRESHOLD)
+            result, times = benchmark_template(frames, labels, template, threshold, strategy, repeat, locations)
+            per_template[template.name] = result
+            all_times.extend(times)
+            for count in totals:
+                totals[count] += result[count]
+            log.info("%-8s %-32s p50 %8.2f ms  p99 %8.2f ms  precision %s  recall %s", strategy, template.name,
+                     result['p50_ms'], result['p99_ms'], result['precision'], result['recall'])
+
+        summary = {**percentiles(all_times), **totals,
+                   'precision': ratio(totals['tp'], totals['tp'] + totals['fp']),
+                   'recall': ratio(totals['tp'], totals['tp'] + totals['fn'])}
+        results[strategy] = {'summary': summary, 'templates': per_template}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark template matching latency and accuracy on recorded frames.")
+    parser.add_argument('task', choices=sorted(TASKS), help="task whose templates and thresholds are benchmarked")
+    parser.add_argument('corpus', help="directory of PNG captures or an .npz file with a 'frames' array")
+    parser.add_argument('--labels', help="JSON file with the templates visible on each frame")
+    parser.add_argument('--output', default='benchmark.json', help="JSON file the results are written to")
+    parser.add_argument('--strategy', action='append', choices=sorted(STRATEGIES), help="only run these strategies")
+    parser.add_argument('--template', action='append', help="only benchmark these template names, e.g. buttons/insane")
+    parser.add_argument('--threshold', action='append', default=[], metavar='NAME=VALUE', help="override a template's threshold")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per template and frame")
+    args = parser.parse_args()
+
+    task = load_task(args.task)
+    thresholds = dict(task.THRESHOLDS)
+    for override in args.threshold:
+        name, _, value = override.partition('=')
+        thresholds[name.lower()] = float(value)
+
+    registry = load_templates(task.RESOURCES_DIR)
+    wanted = [name.lower() for name in args.template] if args.template else None
+    templates = [registry[name] for name in sorted(registry)
+                 if name.split('/')[0] in TEMPLATE_DIRS and (wanted is None or name in wanted)]
+
+    frames = load_corpus(args.corpus)
+    labels = load_labels(args.labels) if args.labels else {}
+    strategies = args.strategy or list(STRATEGIES)
+    results = run_benchmark(frames, labels, templates, thresholds, strategies, args.repeat)
+
+    report = {'task': args.task, 'corpus': os.path.abspath(args.corpus), 'frames': len(frames),
+              'labeled_frames': sum(key in labels for key, _ in frames), 'repeat': args.repeat,
+              'resolution': matching._resolution(frames[0][1]), 'opencv': cv2.__version__,
+              'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'strategies': results}
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    log.info("Results written to %s", args.output)
+
+
+if __name__ == '__main__':
+    main()
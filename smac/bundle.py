@@ -0,0 +1,133 @@
+# Author: Kyle Mathias
+
+# Compiles the templates of a task, with the variants the matcher uses, into one file that is memory-mapped at
+# startup instead of decoding every PNG:
+#
+#     python -m smac.bundle [money] [token]
+#
+# This writes templates.npy (every image one after another, as raw bytes) and templates.json (where each image is in
+# it and which PNGs it was built from) next to the task's buttons/ and screens/. Loading the bundle decodes nothing,
+# and worker processes that map the same file share its pages instead of each holding a copy of the templates.
+# Run it again after changing a template; a bundle that no longer matches its PNGs is ignored.
+
+import argparse
+import json
+import os
+import sys
+import zlib
+import cv2
+import numpy as np
+from . import log
+
+BUNDLE_FILE = 'templates.npy'
+INDEX_FILE = 'templates.json'
+VERSION = 1
+
+# Downscaled copies stored for every template, the scales MATCH_MODES search at
+SCALES = (0.5, 0.25)
+
+
+def _sources(resources_dir):
+    """ Relative path -> CRC32 of every PNG under resources_dir. """
+    sources = {}
+    for root, _, files in os.walk(resources_dir):
+        for file in files:
+            if file.lower().endswith('.png'):
+                path = os.path.join(root, file)
+                with open(path, 'rb') as f:
+                    sources[os.path.relpath(path, resources_dir).replace(os.sep, '/')] = zlib.crc32(f.read())
+    return sources
+
+
+def _arrays(template):
+    """ Every array of a template worth storing, by key: the colour variants, mask and downscaled copies. """
+    arrays = {'image': template.image, 'gray': template.gray, 'bgr': template.bgr, 'bgra': template.bgra}
+    if template.mask is not None:
+        arrays['mask'] = template.mask
+    for scale in SCALES:
+        for gray in (True, False):
+            arrays[f"{'gray' if gray else 'bgra'}@{scale}"] = template.scaled(scale, gray)
+    return arrays
+
+
+def compile_bundle(resources_dir):
+    """ Decode the PNGs under resources_dir and write the bundle and its index there. Returns the number of templates. """
+    from .templates import Template, template_name
+    resources_dir = os.path.abspath(resources_dir)
+    sources = _sources(resources_dir)
+
+    index = {'version': VERSION, 'sources': sources, 'templates': {}}
+    chunks = []
+    offset = 0
+    for relative_path in sorted(sources):
+        path = os.path.join(resources_dir, *relative_path.split('/'))
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            log.warning("Image file could not be decoded: %s", path)
+            continue
+        template = Template(template_name(path, resources_dir), path, image)
+        entries = {}
+        stored = {}  # Variants that are the same array (e.g. the image and its BGRA variant) are stored once
+        for key, array in _arrays(template).items():
+            if id(array) not in stored:
+                contiguous = np.ascontiguousarray(array, dtype=np.uint8)
+                stored[id(array)] = [offset, list(contiguous.shape)]
+                chunks.append(contiguous.reshape(-1))
+                offset += contiguous.size
+            entries[key] = stored[id(array)]
+        index['templates'][template.name] = {'path': relative_path, 'arrays': entries}
+
+    np.save(os.path.join(resources_dir, BUNDLE_FILE), np.concatenate(chunks) if chunks else np.zeros(0, np.uint8))
+    with open(os.path.join(resources_dir, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+    log.info("Compiled %d templates into %s (%.1f MB).", len(index['templates']),
+             os.path.join(resources_dir, BUNDLE_FILE), offset / 1e6)
+    return len(index['templates'])
+
+
+def load_bundle(resources_dir):
+    """
+    Map the bundle compiled for resources_dir and return its templates by name, or None if there is no bundle
+    or it was built from other PNGs than the ones there now. A frozen build trusts the bundle it was built with.
+    """
+    from .templates import Template
+    index_path = os.path.join(resources_dir, INDEX_FILE)
+    if not os.path.isfile(index_path):
+        return None
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get('version') != VERSION:
+            return None
+        if not getattr(sys, 'frozen', False) and index['sources'] != _sources(resources_dir):
+            log.warning("Template bundle in %s is out of date, run python -m smac.bundle to rebuild it.", resources_dir)
+            return None
+        data = np.load(os.path.join(resources_dir, BUNDLE_FILE), mmap_mode='r')
+    except (OSError, ValueError, KeyError) as e:
+        log.warning("Could not load the template bundle in %s: %s", resources_dir, e)
+        return None
+
+    registry = {}
+    for name, entry in index['templates'].items():
+        # Plain ndarray views on the mapping, read-only and shared by every process that maps the file
+        arrays = {key: np.asarray(data[offset:offset + int(np.prod(shape))]).reshape(shape)
+                  for key, (offset, shape) in entry['arrays'].items()}
+        path = os.path.join(resources_dir, *entry['path'].split('/'))
+        registry[name] = Template(name, path, arrays.pop('image'), arrays)
+    return registry
+
+
+def main():
+    from .tasks import TASKS, load_task
+    parser = argparse.ArgumentParser(description="Compile the templates of the clicker tasks into memory-mapped bundles.")
+    parser.add_argument('task', nargs='*', help=f"tasks to compile: {', '.join(sorted(TASKS))} (default: all)")
+    args = parser.parse_args()
+    unknown = [task_name for task_name in args.task if task_name not in TASKS]
+    if unknown:
+        parser.error(f"unknown task: {', '.join(unknown)}")
+    for task_name in args.task or sorted(TASKS):
+        compile_bundle(load_task(task_name).RESOURCES_DIR)
+
+
+if __name__ == '__main__':
+    main()
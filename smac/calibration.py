@@ -0,0 +1,201 @@
+# Author: Kyle Mathias
+
+# The templates are crops of the game at the size it was drawn when they were taken, so they stop matching once
+# the game window is resized or the monitor uses another DPI scaling. The scale the game is drawn at is found once
+# per frame resolution, by searching a reference screen at every scale, and every template is then resized by it.
+# The resized templates are kept on disk per resolution, so later runs load them and every match stays at one scale.
+
+import json
+import os
+import cv2
+import numpy as np
+from . import log, matching
+from .templates import TEMPLATES, Template, get_template
+
+MIN_SCALE, MAX_SCALE = 0.5, 2.0  # Range of game scales searched
+COARSE_STEP = 0.05  # Scale step of the first pass, on a SEARCH_SCALE frame
+FINE_STEP = 0.01  # Scale step around the best coarse scale, on a REFINE_SCALE frame
+SEARCH_SCALE = 0.25
+REFINE_SCALE = 0.5
+MIN_SCORE = 0.8  # The reference screen counts as found from this score on
+NATIVE_TOLERANCE = 0.02  # Scales this close to 1 use the templates as they are, without resampling them
+
+INDEX_FILE = 'index.json'
+
+_cache_dir = None  # Directory with one folder of resized templates per resolution
+_originals = None  # The templates as loaded, before any resizing
+_resolution = None  # Resolution the templates currently fit
+_scale = 1.0  # Scale the templates are currently resized by
+_known = False  # Whether _scale has been confirmed for _resolution
+
+
+def use_cache(directory):
+    """ Keep the calibrated scale and resized templates of each resolution under directory. """
+    global _cache_dir
+    _cache_dir = directory
+
+
+def prepare(frame):
+    """
+    Make the templates fit the resolution of frame, using the scale found for it before if there is one.
+    Returns whether the scale for this resolution is known; if not, the templates are used as they are.
+    """
+    global _originals, _resolution, _known
+    resolution = matching._resolution(frame)
+    if resolution == _resolution:
+        return _known
+    if _originals is None:
+        _originals = dict(TEMPLATES)
+    _resolution = resolution
+
+    index = _read_index(resolution)
+    if index is None:
+        _apply(1.0, {})
+        _known = False
+        return False
+    _apply(index['scale'], _load_resized(resolution, index['scale']) if index['scale'] != 1.0 else {})
+    _known = True
+    log.info("Templates scaled by %.2f for %s.", index['scale'], resolution)
+    return True
+
+
+def confirm(frame):
+    """ Remember that the templates in use match on frames of this resolution, so it is never searched again. """
+    global _known
+    if not _known and matching._resolution(frame) == _resolution:
+        _known = True
+        _write_index(_resolution, _scale, None)
+
+
+def forget():
+    """ Search for the scale again on the next calibrate(), e.g. when the game stopped matching after a resize. """
+    global _known
+    _known = False
+
+
+def calibrate(frame, image_paths):
+    """
+    Search frame for the first of the reference templates it shows at every scale and, if one is found, resize
+    every template by that scale and save them for this resolution. Returns the scale, or None if none is on frame.
+    """
+    global _known
+    for image_path in image_paths:
+        scale, score = find_scale(frame, _originals[get_template(image_path).name])
+        if scale is not None:
+            break
+        log.debug("%s not found at any scale (best score %.3f).", image_path, score)
+    else:
+        return None
+
+    if abs(scale - 1.0) <= NATIVE_TOLERANCE:
+        scale = 1.0
+    log.info("Game found at scale %.2f (score %.3f) on %s.", scale, score, _resolution)
+    resized = {name: resize(original, scale) for name, original in _originals.items()} if scale != 1.0 else {}
+    _apply(scale, resized)
+    _known = True
+    _save_resized(_resolution, resized)
+    _write_index(_resolution, scale, round(score, 4))
+    return scale
+
+
+def find_scale(frame, template):
+    """
+    Multi-scale search for a template: a coarse pass over every scale on a small grayscale frame, then a finer
+    one around the best scale on a larger one. Returns (scale, score), scale None if it scores below MIN_SCORE.
+    """
+    gray = matching._frame_level(frame, 1.0, True)
+    largest = min(MAX_SCALE, gray.shape[0] / template.h, gray.shape[1] / template.w)
+    if largest < MIN_SCALE:
+        return None, -1.0
+
+    level = cv2.resize(gray, None, fx=SEARCH_SCALE, fy=SEARCH_SCALE, interpolation=cv2.INTER_AREA)
+    coarse = np.arange(MIN_SCALE, largest + 1e-9, COARSE_STEP)
+    best_scale, _ = max(((scale, _score(level, template, scale * SEARCH_SCALE)) for scale in coarse), key=lambda item: item[1])
+
+    level = cv2.resize(gray, None, fx=REFINE_SCALE, fy=REFINE_SCALE, interpolation=cv2.INTER_AREA)
+    fine = np.arange(max(MIN_SCALE, best_scale - COARSE_STEP), min(largest, best_scale + COARSE_STEP) + 1e-9, FINE_STEP)
+    best_scale, best_score = max(((scale, _score(level, template, scale * REFINE_SCALE)) for scale in fine), key=lambda item: item[1])
+    if best_score < MIN_SCORE:
+        return None, best_score
+    return round(float(best_scale), 3), best_score
+
+
+def _score(level, template, factor):
+    """ Best TM_CCOEFF_NORMED score of the grayscale template resized by factor on level. """
+    image = cv2.resize(template.gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    if image.shape[0] > level.shape[0] or image.shape[1] > level.shape[1] or min(image.shape) < 4:
+        return -1.0
+    return float(cv2.minMaxLoc(cv2.matchTemplate(level, image, cv2.TM_CCOEFF_NORMED))[1])
+
+
+def resize(template, scale):
+    """ Copy of a template as the game draws it at scale. """
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    image = cv2.resize(template.image, None, fx=scale, fy=scale, interpolation=interpolation)
+    return Template(template.name, template.path, image)
+
+
+def _apply(scale, resized):
+    """ Put the templates resized by scale (or the originals, for the names missing from resized) in the registry. """
+    global _scale
+    if scale == _scale and not resized:
+        return
+    _scale = scale
+    for name, original in _originals.items():
+        TEMPLATES[name] = resized.get(name, original)
+    matching.reset()  # Earlier results and cached variants belong to the templates that were replaced
+
+
+def _directory(resolution):
+    return os.path.join(_cache_dir, resolution) if _cache_dir else None
+
+
+def _read_index(resolution):
+    directory = _directory(resolution)
+    if not directory or not os.path.isfile(os.path.join(directory, INDEX_FILE)):
+        return None
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("Could not read calibration for %s: %s", resolution, e)
+        return None
+
+
+def _write_index(resolution, scale, score):
+    directory = _directory(resolution)
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, INDEX_FILE), 'w') as f:
+            json.dump({'scale': scale, 'score': score}, f)
+    except OSError as e:
+        log.warning("Could not write calibration for %s: %s", resolution, e)
+
+
+def _save_resized(resolution, resized):
+    """ Write the resized templates as PNGs named like the registry, e.g. buttons/close.png. """
+    directory = _directory(resolution)
+    if not directory:
+        return
+    for name, template in resized.items():
+        path = os.path.join(directory, *name.split('/')) + '.png'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        except OSError as e:
+            log.warning("Could not write calibrated templates for %s: %s", resolution, e)
+            return
+        if not cv2.imwrite(path, template.image):
+            log.warning("Could not write %s", path)
+
+
+def _load_resized(resolution, scale):
+    """ The templates saved for a resolution. Templates missing from disk are resized by scale again. """
+    directory = _directory(resolution)
+    resized = {}
+    for name, original in _originals.items():
+        path = os.path.join(directory, *name.split('/')) + '.png'
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED) if os.path.isfile(path) else None
+        resized[name] = Template(name, original.path, image) if image is not None else resize(original, scale)
+    return resized
@@ -0,0 +1,191 @@
+# Author: Kyle Mathias
+
+import os
+import time
+import cv2
+import numpy as np
+from . import clock, log
+
+# Frame rate of recordings that do not say when each frame was grabbed, the rate the live producer grabs at most
+RECORDED_FPS = 15
+
+# Seconds since the first frame of each frame of a recorded PNG directory, one per line
+TIMES_FILE = 'times.txt'
+
+
+class ReplayFinished(Exception):
+    """ Raised by ReplayCapture when every recorded frame has been played. """
+
+
+class ScreenCapture:
+    """ Keeps a single mss session open and grabs frames of one monitor on demand. """
+
+    def __init__(self, monitor=1, region=None):
+        import mss  # Only the live backend needs a desktop to capture
+        self.sct = mss.mss()
+        self.monitor = self.sct.monitors[monitor]
+        if region:
+            # Only capture (left, top, width, height) of the monitor, e.g. one game window of several
+            left, top, width, height = region
+            self.monitor = {'left': self.monitor['left'] + left, 'top': self.monitor['top'] + top,
+                            'width': width, 'height': height}
+
+        # Screen position of the frame's top left corner, to turn frame coordinates into click positions
+        self.left = self.monitor['left']
+        self.top = self.monitor['top']
+        self.frame = None  # Most recent frame, shared by every match made during one detection tick
+        self.grabbed_at = None  # When it was grabbed, to measure how long a click took to follow it
+
+    def grab(self):
+        """ Grab a new BGRA frame of the monitor. """
+        started = time.perf_counter()
+        shot = self.sct.grab(self.monitor)
+        # Wrap the BGRA pixels mss returns instead of copying them. mss fills a new buffer on every grab,
+        # so frames handed out earlier never change under whoever still holds them.
+        self.frame = np.frombuffer(shot.raw, np.uint8).reshape(shot.height, shot.width, 4)
+        self.grabbed_at = clock.now()
+        log.timing('capture', None, time.perf_counter() - started)
+        return self.frame
+
+    def close(self):
+        self.sct.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayCapture:
+    """
+    Plays back recorded frames instead of capturing the screen: a directory of PNG files (in file name
+    order) or an .npz file holding a 'frames' array. Every grab returns the next frame; skip_to() moves
+    on to the frame that was on screen a given number of seconds into the recording, so a replay on
+    virtual time sees the frames the game showed while the flow was waiting go by. When each frame was
+    recorded comes from the recording (times.txt in the directory, or a 'times' array in the .npz), or
+    from fps for recordings without it. With loop, playback starts over instead of finishing.
+    """
+
+    def __init__(self, path, loop=False, fps=RECORDED_FPS):
+        self.path = path
+        self.loop = loop
+        self.left = self.top = 0
+        self.frame = None
+        self.grabbed_at = None
+        self.index = 0
+
+        times = None
+        if os.path.isdir(path):
+            self.files = sorted(os.path.join(path, file) for file in os.listdir(path) if file.lower().endswith('.png'))
+            self.frames = None
+            count = len(self.files)
+            times_path = os.path.join(path, TIMES_FILE)
+            if os.path.isfile(times_path):
+                times = np.loadtxt(times_path, ndmin=1)
+        else:
+            self.files = None
+            recording = np.load(path)
+            self.frames = recording['frames']
+            count = len(self.frames)
+            if 'times' in recording.files:
+                times = recording['times']
+
+        if count == 0:
+            raise ValueError(f"No frames to replay in {path}")
+        if times is None or len(times) != count:
+            times = np.arange(count) / fps
+        self.count = count
+        self.times = np.asarray(times, np.float64) - times[0]  # Seconds into the recording of each frame
+        self.duration = self.times[-1] + 1 / fps  # The last frame stays on screen for one more frame
+        self.offset = 0.0  # Seconds of playback before the current pass through the recording, when looping
+        log.info("Replaying %d frames (%.1fs) from %s", count, self.duration, path)
+
+    def skip_to(self, seconds):
+        """ Skip ahead to the last frame recorded at most seconds after playback started. Never goes back. """
+        while self.index + 1 < self.count and self.offset + self.times[self.index + 1] <= seconds:
+            self.index += 1
+
+    def next_at(self):
+        """ Seconds after playback started that the frame grab() returns next was recorded at. """
+        if self.index >= self.count:
+            return self.offset + self.duration
+        return self.offset + self.times[self.index]
+
+    def grab(self):
+        """ Return the next recorded frame as BGRA. """
+        if self.index >= self.count:
+            if not self.loop:
+                raise ReplayFinished(self.path)
+            self.index = 0
+            self.offset += self.duration
+
+        started = time.perf_counter()
+        if self.files is not None:
+            frame = cv2.imread(self.files[self.index], cv2.IMREAD_UNCHANGED)
+        else:
+            frame = self.frames[self.index]
+        self.index += 1
+
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGRA)
+        elif frame.shape[2] == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+        self.frame = frame
+        self.grabbed_at = clock.now()
+        log.timing('capture', None, time.perf_counter() - started)
+        return frame
+
+    def close(self):
+        pass
+
+
+class FrameRecorder:
+    """
+    Wraps another capture and saves every frame it grabs as a numbered PNG, for later replay, with when it
+    was grabbed in TIMES_FILE.
+    """
+
+    def __init__(self, capture, directory):
+        self.capture = capture
+        self.directory = directory
+        self.count = 0
+        self.started = None
+        os.makedirs(directory, exist_ok=True)
+        self.times = open(os.path.join(directory, TIMES_FILE), 'w')
+
+    @property
+    def frame(self):
+        return self.capture.frame
+
+    @property
+    def grabbed_at(self):
+        return self.capture.grabbed_at
+
+    @property
+    def left(self):
+        return self.capture.left
+
+    @property
+    def top(self):
+        return self.capture.top
+
+    def skip_to(self, seconds):
+        self.capture.skip_to(seconds)  # Only a replay has frames to skip, e.g. when re-recording one
+
+    def next_at(self):
+        return self.capture.next_at()
+
+    def grab(self):
+        frame = self.capture.grab()
+        if self.started is None:
+            self.started = self.capture.grabbed_at
+        cv2.imwrite(os.path.join(self.directory, f"{self.count:06d}.png"), frame)
+        self.times.write(f"{self.capture.grabbed_at - self.started:.4f}\n")
+        self.times.flush()
+        self.count += 1
+        return frame
+
+    def close(self):
+        self.times.close()
+        self.capture.close()
@@ -0,0 +1,57 @@
+# Author: Kyle Mathias
+
+import cv2
+import numpy as np
+
+# Frames are compared on a grayscale copy downscaled by this factor
+THUMBNAIL_SCALE = 0.125
+
+# Side of a tile in frame pixels, and the mean absolute difference above which a tile counts as changed
+TILE_SIZE = 64
+TILE_TOLERANCE = 3.0
+
+# (frame, thumbnail) of the most recent frame, so every template matched on it shares one conversion.
+# Kept as one tuple so the matching thread and the event loop never see a thumbnail of another frame.
+_thumbnail = (None, None)
+
+
+def thumbnail(frame):
+    """ Downscaled grayscale copy of a frame, computed once per frame. """
+    global _thumbnail
+    cached_frame, cached = _thumbnail
+    if frame is not cached_frame:
+        small = cv2.resize(frame, None, fx=THUMBNAIL_SCALE, fy=THUMBNAIL_SCALE, interpolation=cv2.INTER_AREA)
+        cached = cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY) if small.ndim == 3 else small
+        _thumbnail = (frame, cached)
+    return cached
+
+
+def frame_difference(a, b):
+    """ Mean absolute difference between two thumbnails. """
+    return cv2.absdiff(a, b).mean()
+
+
+def changed_tiles(previous, current):
+    """ Boolean grid with one entry per tile, True where the two thumbnails differ. """
+    rows = max(1, int(np.ceil(current.shape[0] / (TILE_SIZE * THUMBNAIL_SCALE))))
+    cols = max(1, int(np.ceil(current.shape[1] / (TILE_SIZE * THUMBNAIL_SCALE))))
+    tile_means = cv2.resize(cv2.absdiff(previous, current), (cols, rows), interpolation=cv2.INTER_AREA)
+    return tile_means > TILE_TOLERANCE
+
+
+def changed_bounds(tiles, frame_shape, pad_w=0, pad_h=0):
+    """
+    Bounding box (left, top, right, bottom) in frame pixels of the changed tiles, grown by pad_w and pad_h
+    so a template overlapping the changed area still fits inside it. None when nothing changed.
+    """
+    rows, cols = np.nonzero(tiles)
+    if len(rows) == 0:
+        return None
+
+    frame_h, frame_w = frame_shape[:2]
+    tile_h, tile_w = frame_h / tiles.shape[0], frame_w / tiles.shape[1]
+    left = max(0, int(cols.min() * tile_w) - pad_w)
+    top = max(0, int(rows.min() * tile_h) - pad_h)
+    right = min(frame_w, int(np.ceil((cols.max() + 1) * tile_w)) + pad_w)
+    bottom = min(frame_h, int(np.ceil((rows.max() + 1) * tile_h)) + pad_h)
+    return left, top, right, bottom
@@ -0,0 +1,29 @@
+# Author: Kyle Mathias
+
+import asyncio
+import time
+
+# Waits and timeouts go through this module so a replayed session can run on virtual time,
+# as fast as the frames can be matched, instead of sleeping for real
+_virtual_now = None
+
+
+def now():
+    """ Monotonic time in seconds, real or virtual. """
+    return time.monotonic() if _virtual_now is None else _virtual_now
+
+
+async def sleep(seconds):
+    """ Sleep for real, or just move virtual time forward. Other tasks run in the meantime either way. """
+    global _virtual_now
+    if _virtual_now is None:
+        await asyncio.sleep(seconds)
+    else:
+        _virtual_now += max(0.0, seconds)
+        await asyncio.sleep(0)
+
+
+def use_virtual_time(start=0.0):
+    """ Switch to virtual time, starting at start seconds. """
+    global _virtual_now
+    _virtual_now = start
@@ -0,0 +1,114 @@
+# Author: Kyle Mathias
+
+import json
+import os
+import psutil
+from . import log
+
+TERMINATE_TIMEOUT = 5  # Seconds a game gets to close after being asked to, before it is killed
+
+
+def find_instances(app_name):
+    """ Every running process called app_name. This scans the whole process table, so it is only used once at start up. """
+    app_name = app_name.lower()
+    return [process for process in psutil.process_iter(['name']) if (process.info['name'] or '').lower() == app_name]
+
+
+def terminate(processes, timeout=TERMINATE_TIMEOUT):
+    """
+    Ask every process to close at the same time and kill the ones still running after timeout.
+    Returns the PIDs of the processes that are gone.
+    """
+    for process in processes:
+        try:
+            process.terminate()
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.AccessDenied:
+            log.warning("Access denied when trying to terminate PID %d", process.pid)
+
+    # wait_procs returns as soon as every process has exited, so there is no fixed delay
+    _, alive = psutil.wait_procs(processes, timeout=timeout)
+    if alive:
+        for process in alive:
+            try:
+                process.kill()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        _, alive = psutil.wait_procs(alive, timeout=timeout)
+        for process in alive:
+            log.warning("Failed to stop PID %d", process.pid)
+    return [process.pid for process in processes if process not in alive]
+
+
+class Game:
+    """
+    The game process a clicker started, tracked by PID instead of by scanning for its name. The PID is
+    saved to pid_path, so the next run can close a game left behind by a crash without a scan either.
+    """
+
+    def __init__(self, app_path, app_name, pid_path=None):
+        self.app_path = app_path
+        self.app_name = app_name
+        self.pid_path = pid_path
+        self.process = self._load_pid()
+
+    def is_running(self):
+        if self.process is None:
+            return False
+        try:
+            return self.process.is_running() and self.process.status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+
+    def start(self):
+        """ Close the game if it is running and start a new copy. """
+        self.stop()
+        log.info("Opening the application...")
+        self.process = psutil.Popen([self.app_path])
+        self._save_pid()
+
+    def stop(self):
+        """ Close the game this clicker started, without touching any other copy. """
+        if self.process is not None:
+            terminate([self.process])
+            self.process = None
+            self._save_pid()
+
+    def stop_all(self):
+        """ Close every copy of the game, including ones opened by hand. """
+        self.stop()
+        instances = find_instances(self.app_name)
+        if instances:
+            pids = terminate(instances)
+            log.info("Terminated %d instance(s) of %s: %s", len(pids), self.app_name, pids)
+        else:
+            log.info("No instances of %s found.", self.app_name)
+
+    def _load_pid(self):
+        """ The game a previous run saved to pid_path, if it is still running. """
+        if not self.pid_path or not os.path.isfile(self.pid_path):
+            return None
+        try:
+            with open(self.pid_path) as f:
+                saved = json.load(f)
+            if not saved:
+                return None
+            process = psutil.Process(saved['pid'])
+            # A PID can be reused by an unrelated process once the game has exited
+            if process.create_time() != saved['create_time']:
+                return None
+            return process
+        except (OSError, ValueError, KeyError, psutil.Error):
+            return None
+
+    def _save_pid(self):
+        if not self.pid_path:
+            return
+        saved = {'pid': self.process.pid, 'create_time': self.process.create_time()} if self.process else None
+        try:
+            os.makedirs(os.path.dirname(self.pid_path), exist_ok=True)
+            with open(self.pid_path, 'w') as f:
+                json.dump(saved, f)
+        except (OSError, psutil.Error) as e:
+            log.warning("Could not write %s: %s", self.pid_path, e)
@@ -0,0 +1,33 @@
+# Author: Kyle Mathias
+
+import json
+from . import clock, log
+
+
+class PyAutoGuiInput:
+    """ Clicks on the real screen with pyautogui. """
+
+    def __init__(self):
+        import pyautogui  # Only the live backend needs a desktop to click on
+        self.pyautogui = pyautogui
+        # The clicker waits for the screen to react itself, the pause pyautogui adds after every call only delays it
+        pyautogui.PAUSE = 0
+
+    def click(self, x, y):
+        self.pyautogui.click(x, y)
+
+
+class FakeInput:
+    """ Records clicks instead of making them, optionally appending each one to a JSONL file. """
+
+    def __init__(self, log_path=None):
+        self.clicks = []
+        self.log_file = open(log_path, 'a') if log_path else None
+
+    def click(self, x, y):
+        event = {'t': round(clock.now(), 3), 'x': int(x), 'y': int(y)}
+        self.clicks.append(event)
+        log.info("Click at (%d, %d)", x, y)
+        if self.log_file:
+            self.log_file.write(json.dumps(event) + '\n')
+            self.log_file.flush()
@@ -0,0 +1,188 @@
+# Author: Kyle Mathias
+
+import json
+import threading
+import time
+from . import clock
+
+# Message levels. Messages below LEVEL are dropped before their arguments are formatted,
+# so debug messages inside polling loops cost a function call and a comparison
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+LEVEL = INFO
+
+# Events are buffered and written to the JSONL file in batches of this many,
+# or once the oldest buffered event is this many seconds old
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 5.0
+
+_file = None
+_buffer = []
+_last_flush = 0.0
+_source = None
+_prefix = ''
+_closed = False
+
+# Events and timings come from the flow and from the capture, matching and action threads
+_lock = threading.RLock()
+
+# Time spent per (kind, name) as [count, seconds], for the end of run summary
+_totals = {}
+
+# Seconds spent in each state during the current cycle (one battle or one ad), and the finished cycles
+_cycle = {}
+_cycle_started = None
+_cycles = []
+
+_started = time.monotonic()
+
+
+def configure(path=None, level=INFO, source=None):
+    """
+    Set the message level, and start writing events to the JSONL file at path (appended to).
+    source names the worker in messages and events when several run side by side.
+    """
+    global LEVEL, _file, _prefix, _source
+    LEVEL = level
+    _source = source
+    _prefix = f"[{source}] " if source else ''
+    if path:
+        _file = open(path, 'a')
+
+
+def debug(message, *args):
+    if LEVEL <= DEBUG:
+        _log(DEBUG, message, args)
+
+
+def info(message, *args):
+    if LEVEL <= INFO:
+        _log(INFO, message, args)
+
+
+def warning(message, *args):
+    if LEVEL <= WARNING:
+        _log(WARNING, message, args)
+
+
+def error(message, *args):
+    if LEVEL <= ERROR:
+        _log(ERROR, message, args)
+
+
+def _log(level, message, args):
+    text = message % args if args else message
+    print(_prefix + text)
+    if _file is not None and level >= WARNING:
+        event('log', level=level, message=text)
+
+
+def event(kind, **fields):
+    """ Record an event with the current (monotonic or virtual) time. Does nothing unless a file is configured. """
+    if _file is None:
+        return
+    if _source:
+        fields['source'] = _source
+    with _lock:
+        _buffer.append({'t': round(clock.now(), 4), 'event': kind, **fields})
+        if len(_buffer) >= BATCH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+            flush()
+
+
+def timing(kind, name, seconds, **fields):
+    """ Add seconds to the totals of (kind, name), e.g. ('match', 'buttons/close'), and record it as an event. """
+    with _lock:
+        total = _totals.get((kind, name))
+        if total is None:
+            total = _totals[kind, name] = [0, 0.0]
+        total[0] += 1
+        total[1] += seconds
+        if kind == 'state':
+            _cycle[name] = _cycle.get(name, 0.0) + seconds
+    if _file is not None:
+        event(kind, name=name, ms=round(seconds * 1000, 3), **fields)
+
+
+def start_cycle():
+    """ Start timing the first cycle, e.g. once the game has loaded. Does nothing while a cycle is open. """
+    global _cycle_started
+    with _lock:
+        if _cycle_started is None:
+            _cycle_started = clock.now()
+            _cycle.clear()
+
+
+def open_cycle():
+    """ (seconds, seconds per state) of the cycle in progress, or None if none was started. """
+    with _lock:
+        if _cycle_started is None:
+            return None
+        return clock.now() - _cycle_started, dict(_cycle)
+
+
+def cycle(label):
+    """
+    Mark the end of one cycle (a battle, an ad) so the summary can tell where the time of each one went.
+    Returns (seconds, seconds per state) of the cycle that ended, or None if no cycle had been started.
+    """
+    global _cycle_started
+    with _lock:
+        now = clock.now()
+        finished = None
+        if _cycle_started is not None:
+            finished = (now - _cycle_started, dict(_cycle))
+            _cycles.append(finished)
+            event('cycle', label=label, seconds=round(now - _cycle_started, 3),
+                  states={name: round(seconds, 3) for name, seconds in _cycle.items()})
+        _cycle_started = now
+        _cycle.clear()
+        return finished
+
+
+def flush():
+    """ Write the buffered events to the file. """
+    global _last_flush
+    with _lock:
+        _last_flush = time.monotonic()
+        if _file is None or not _buffer:
+            return
+        _file.write(''.join(json.dumps(record) + '\n' for record in _buffer))
+        _file.flush()
+        _buffer.clear()
+
+
+def summary():
+    """ Where the time went: totals per kind and name, and the average cycle split by state. """
+    with _lock:
+        totals = [(key, tuple(total)) for key, total in _totals.items()]
+        cycles = list(_cycles)
+    lines = [f"--- Run summary ({(time.monotonic() - _started) / 60:.1f} minutes) ---"]
+    for (kind, name), (count, seconds) in sorted(totals, key=lambda item: (item[0][0], -item[1][1])):
+        label = f"{kind} {name}" if name else kind
+        lines.append(f"{label}: {count} x {seconds / count * 1000:.1f} ms = {seconds:.1f}s")
+
+    if cycles:
+        average = sum(duration for duration, _ in cycles) / len(cycles)
+        lines.append(f"{len(cycles)} cycle(s), {average:.1f}s on average:")
+        states = {}
+        for _, cycle_states in cycles:
+            for name, seconds in cycle_states.items():
+                states[name] = states.get(name, 0.0) + seconds / len(cycles)
+        for name, seconds in sorted(states.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name}: {seconds:.1f}s ({seconds / average:.0%})" if average else f"  {name}: {seconds:.1f}s")
+    return lines
+
+
+def close():
+    """ Print the summary and write out the remaining events. Safe to call more than once. """
+    global _file, _closed
+    if _closed:
+        return
+    _closed = True
+    for line in summary():
+        info(line)
+    with _lock:
+        flush()
+        if _file is not None:
+            _file.close()
+            _file = None
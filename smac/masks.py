@@ -0,0 +1,124 @@
+# Author: Kyle Mathias
+
+# Masks of the pixels of a template that are worth comparing. Large screen crops also show numbers, timers and
+# animations that differ every time the screen is seen, and those pixels pull the match score down. For the
+# templates a mask is learned for, every sighting counts which pixels differed from the template; the pixels that
+# keep differing are left out of the mask, so only the invariant ones are compared. Transparent pixels of a PNG
+# are always left out (see Template.mask). Learned counts are kept on disk, so later runs start with the mask.
+
+import os
+import cv2
+import numpy as np
+from . import log
+from .templates import get_template
+
+DIFFERENCE = 40  # A pixel differs from the template from this grayscale difference on...
+UNSTABLE = 0.2  # ...and is left out of the mask once it differed in this share of the sightings
+MIN_SIGHTINGS = 5  # Sightings before a learned mask is used
+MAX_SIGHTINGS = 200  # Sightings after which the mask no longer changes
+MIN_KEPT = 0.5  # A learned mask that leaves out more than half the template is not used
+SAVE_EVERY = 5  # Sightings between writes to disk
+
+LEARNED = set()  # Names of the templates a mask is learned for
+
+_cache_dir = None  # Directory the counts are kept in, one .npz per template
+_counts = {}  # Template name -> [shape, sightings, per pixel number of sightings it differed in]
+_masks = {}  # Template name -> (template, mask) of the last mask_of()
+
+
+def use_cache(directory):
+    """ Keep the learned counts under directory. """
+    global _cache_dir
+    _cache_dir = directory
+    _counts.clear()
+    _masks.clear()
+
+
+def learn_mask(name_or_path):
+    """ Learn which pixels of a template stay the same from its sightings. """
+    template = get_template(name_or_path)
+    if template is not None:
+        LEARNED.add(template.name)
+
+
+def mask_of(template):
+    """ The mask to match a template with: its opaque pixels, less the ones learned to change. None compares all. """
+    cached = _masks.get(template.name)
+    if cached is not None and cached[0] is template:
+        return cached[1]
+
+    mask = template.mask
+    learned = _learned(template)
+    if learned is not None:
+        mask = learned if mask is None else cv2.bitwise_and(mask, learned)
+    _masks[template.name] = (template, mask)
+    return mask
+
+
+def ready(template):
+    """ Whether the mask of a template is known: it is not learned, or was learned from enough sightings. """
+    return template.name not in LEARNED or _load(template)[1] >= MIN_SIGHTINGS
+
+
+def observe(template, crop):
+    """ Count the pixels of crop, where template was just found on a frame, that differ from it. """
+    counts = _load(template)
+    if counts[1] >= MAX_SIGHTINGS:
+        return
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGRA2GRAY)
+    counts[2] += cv2.absdiff(gray, template.gray) >= DIFFERENCE
+    counts[1] += 1
+    if counts[1] >= MIN_SIGHTINGS:
+        _masks.pop(template.name, None)  # The mask changed with this sighting
+    if counts[1] % SAVE_EVERY == 0:
+        _save(template.name, counts)
+
+
+def _learned(template):
+    if template.name not in LEARNED:
+        return None
+    shape, sightings, differed = _load(template)
+    if sightings < MIN_SIGHTINGS:
+        return None
+    mask = np.where(differed < UNSTABLE * sightings, 255, 0).astype(np.uint8)
+    if np.count_nonzero(mask) < MIN_KEPT * mask.size:
+        log.debug("Learned mask of %s left out too much, not using it.", template.name)
+        return None
+    return mask
+
+
+def _path(name):
+    return os.path.join(_cache_dir, *name.split('/')) + '.npz' if _cache_dir else None
+
+
+def _load(template):
+    """ The counts of a template, read from disk on first use. Counts for another size of it start over. """
+    counts = _counts.get(template.name)
+    if counts is not None and counts[0] == template.gray.shape:
+        return counts
+
+    counts = [template.gray.shape, 0, np.zeros(template.gray.shape, np.uint16)]
+    path = _path(template.name)
+    if path and os.path.isfile(path):
+        try:
+            with np.load(path) as saved:
+                if saved['differed'].shape == template.gray.shape:
+                    counts = [template.gray.shape, int(saved['sightings']), saved['differed'].astype(np.uint16)]
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Could not read the learned mask %s: %s", path, e)
+    _counts[template.name] = counts
+    return counts
+
+
+def _save(name, counts):
+    path = _path(name)
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written next to it first, so workers learning the same mask never read half a file
+        partial = f"{path[:-len('.npz')]}.{os.getpid()}.npz"
+        np.savez(partial, sightings=counts[1], differed=counts[2])
+        os.replace(partial, path)
+    except OSError as e:
+        log.warning("Could not write the learned mask %s: %s", path, e)
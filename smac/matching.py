@@ -0,0 +1,480 @@
+# Author: Kyle Mathias
+
+from collections import namedtuple
+import json
+import os
+import time
+import cv2
+import numpy as np
+from . import log, masks
+from .changes import changed_bounds, changed_tiles, thumbnail
+from .templates import Template, get_template
+
+# Centre of a match in frame coordinates together with its TM_CCOEFF_NORMED score
+Match = namedtuple('Match', ['x', 'y', 'score'])
+
+# Optional search regions per template name, as (left, top, right, bottom) fractions of the frame
+SEARCH_REGIONS = {}
+
+# Pixels searched around a cached location on each side of the template
+CACHE_MARGIN = 24
+
+# Per-template matching mode as (scale, gray). A scale below 1 finds candidates on a downscaled frame
+# and only verifies them at full resolution; templates without a mode are matched at full resolution.
+MATCH_MODES = {}
+PYRAMID_CANDIDATES = 3  # Coarse peaks verified at full resolution
+PYRAMID_SLACK = 0.2  # How far below the threshold a coarse peak may score and still be verified
+PYRAMID_MIN_SIZE = 12  # Templates smaller than this once downscaled are matched at full resolution
+
+# Templates found from a few small patches of them instead of the whole crop, name -> number of patches. The
+# first patch is searched for like a template of its own and the others are only checked where it puts them.
+ANCHORS = {}
+ANCHOR_MIN_SIZE, ANCHOR_MAX_SIZE = 24, 96  # Side of a patch, a quarter of the template's shorter side in between
+ANCHOR_UNIQUE = 0.8  # A patch that scores this high anywhere else in its template is not distinctive enough
+ANCHOR_MARGIN = 4  # Pixels the later patches may be off from where the first one puts them
+ANCHOR_LOCATORS = 2  # Patches searched for before the template counts as missing
+
+# match_all drops a hit when it covers more than this fraction of a better hit of the same template
+NMS_OVERLAP = 0.3
+
+# Skip matching where the screen has not changed since a template was last matched
+SKIP_UNCHANGED = True
+
+# Last result per template name as (thumbnail, threshold, Match or None)
+_last_results = {}
+
+# Downscaled copies of the most recent frame, keyed by (scale, gray)
+_pyramid_frame = None
+_pyramid_levels = {}
+
+# Arrays the levels are written into, keyed like _pyramid_levels and reused from frame to frame. Only the
+# matching thread reads the levels, and never after moving on to the next frame.
+_level_buffers = {}
+
+# Patches of the anchored templates as (template, mask, [(x, y, patch Template)]), picked with that mask
+_anchor_patches = {}
+
+
+class LocationCache:
+    """ Remembers where each template was last found, per screen resolution, and keeps it on disk between runs. """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.locations = {}
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    self.locations = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("Could not read location cache %s: %s", path, e)
+
+    def get(self, frame, name):
+        return self.locations.get(_resolution(frame), {}).get(name)
+
+    def put(self, frame, name, x, y):
+        locations = self.locations.setdefault(_resolution(frame), {})
+        if locations.get(name) != [x, y]:
+            locations[name] = [x, y]
+            self.save()  # Only written when a button moves, so this stays off the hot path
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(self.locations, f)
+        except OSError as e:
+            log.warning("Could not write location cache %s: %s", self.path, e)
+
+
+# Shared cache, replaced by the clicker with one that persists to disk
+location_cache = LocationCache()
+
+
+def load_location_cache(path):
+    """ Use a location cache that is read from and saved to path. """
+    global location_cache
+    location_cache = LocationCache(path)
+    return location_cache
+
+
+def _resolution(frame):
+    return f"{frame.shape[1]}x{frame.shape[0]}"
+
+
+def reset():
+    """ Forget every earlier result and downscaled frame, e.g. once the templates have been replaced. """
+    global _pyramid_frame, _pyramid_levels
+    _last_results.clear()
+    _anchor_patches.clear()
+    _pyramid_frame, _pyramid_levels = None, {}
+
+
+def set_search_region(name_or_path, region):
+    """ Restrict the first search for a template to (left, top, right, bottom) fractions of the frame. """
+    template = get_template(name_or_path)
+    if template is not None:
+        SEARCH_REGIONS[template.name] = region
+
+
+def set_match_mode(name_or_path, scale=1.0, gray=False):
+    """
+    Choose between accuracy and speed for a template. scale=1.0 matches at full resolution, while
+    0.5 or 0.25 search a downscaled (optionally grayscale) frame first. The threshold always applies
+    to the full resolution score.
+    """
+    template = get_template(name_or_path)
+    if template is not None:
+        MATCH_MODES[template.name] = (scale, gray)
+
+
+def set_anchors(name_or_path, count=3):
+    """
+    Find a template, typically a large screen crop, from count small distinctive patches of it rather than the
+    whole crop. Its score is the lowest score of the patches.
+    """
+    template = get_template(name_or_path)
+    if template is not None:
+        ANCHORS[template.name] = count
+
+
+def _frame_level(frame, scale, gray):
+    """
+    Return the frame downscaled by scale, computed once per frame. Grayscale levels are resized from one
+    full resolution grayscale copy, so the four channel frame is only read once however many levels there are.
+    """
+    global _pyramid_frame, _pyramid_levels
+    if frame is not _pyramid_frame:
+        _pyramid_frame = frame
+        _pyramid_levels = {}
+
+    key = (scale, gray)
+    if key not in _pyramid_levels:
+        if gray and scale == 1.0:
+            _pyramid_levels[key] = cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY, dst=_level_buffer(key, frame.shape[:2]))
+            return _pyramid_levels[key]
+
+        source = _frame_level(frame, 1.0, True) if gray else frame
+        size = (int(round(source.shape[1] * scale)), int(round(source.shape[0] * scale)))
+        _pyramid_levels[key] = cv2.resize(source, size, dst=_level_buffer(key, (size[1], size[0]) + source.shape[2:]),
+                                          interpolation=cv2.INTER_AREA)
+    return _pyramid_levels[key]
+
+
+def _level_buffer(key, shape):
+    """ The reused array for a level of this shape, allocated again only when the frame size changes. """
+    buffer = _level_buffers.get(key)
+    if buffer is None or buffer.shape != shape:
+        buffer = _level_buffers[key] = np.empty(shape, np.uint8)
+    return buffer
+
+
+def _match_in(frame, template, left, top, right, bottom):
+    """ Run the template match inside a window of the frame. Returns (score, top-left) in frame coordinates. """
+    frame_h, frame_w = frame.shape[:2]
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(frame_w, right), min(frame_h, bottom)
+    if right - left < template.w or bottom - top < template.h:
+        return -1.0, None
+
+    mask = masks.mask_of(template)
+    if mask is None:
+        res = cv2.matchTemplate(frame[top:bottom, left:right], template.bgra, cv2.TM_CCOEFF_NORMED)
+    else:
+        # Only the pixels under the mask are compared; a window that is flat there scores nothing
+        res = cv2.matchTemplate(frame[top:bottom, left:right], template.bgra, cv2.TM_CCOEFF_NORMED, mask=mask)
+        res = np.nan_to_num(res, nan=-1.0, posinf=-1.0, neginf=-1.0)
+    _, max_val, _, max_loc = cv2.minMaxLoc(res)
+    return max_val, (max_loc[0] + left, max_loc[1] + top)
+
+
+def _pyramid_match_in(frame, template, left, top, right, bottom, threshold, scale, gray):
+    """ Coarse-to-fine version of _match_in: returns the best verified (score, top-left), or (-1, None). """
+    small_template = template.scaled(scale, gray)
+    small_h, small_w = small_template.shape[:2]
+    if min(small_h, small_w) < PYRAMID_MIN_SIZE:
+        return _match_in(frame, template, left, top, right, bottom)
+
+    level = _frame_level(frame, scale, gray)
+    small_left, small_top = max(0, int(left * scale)), max(0, int(top * scale))
+    small_right, small_bottom = min(level.shape[1], int(right * scale)), min(level.shape[0], int(bottom * scale))
+    if small_right - small_left < small_w or small_bottom - small_top < small_h:
+        return -1.0, None
+
+    res = cv2.matchTemplate(level[small_top:small_bottom, small_left:small_right], small_template, cv2.TM_CCOEFF_NORMED)
+
+    # Verify the strongest coarse peaks in a small full resolution window around each of them
+    margin = int(1 / scale) + 2
+    best_val, best_loc = -1.0, None
+    for _ in range(PYRAMID_CANDIDATES):
+        _, coarse_val, _, coarse_loc = cv2.minMaxLoc(res)
+        if coarse_val < threshold - PYRAMID_SLACK:
+            break
+
+        x = int((coarse_loc[0] + small_left) / scale)
+        y = int((coarse_loc[1] + small_top) / scale)
+        max_val, max_loc = _match_in(frame, template, max(left, x - margin), max(top, y - margin),
+                                     min(right, x + template.w + margin), min(bottom, y + template.h + margin))
+        if max_val > best_val:
+            best_val, best_loc = max_val, max_loc
+        if best_val >= threshold:
+            break
+
+        # Suppress this peak so the next iteration finds a different candidate
+        cv2.rectangle(res, (coarse_loc[0] - small_w // 2, coarse_loc[1] - small_h // 2),
+                      (coarse_loc[0] + small_w // 2, coarse_loc[1] + small_h // 2), -1.0, -1)
+    return best_val, best_loc
+
+
+def _anchored_match_in(frame, template, left, top, right, bottom, threshold, scale, gray):
+    """
+    _pyramid_match_in for an anchored template: returns (lowest patch score, top-left), or (-1, None). The first
+    patches are searched for in turn until one locates the template; the others are then checked where it puts
+    them. If one of those misses, the whole template is matched (masked) around that place instead, so a patch
+    that turns out to cover changing content cannot hide the screen.
+    """
+    patches = _anchors(template)
+    if patches is None:
+        if scale < 1:
+            return _pyramid_match_in(frame, template, left, top, right, bottom, threshold, scale, gray)
+        return _match_in(frame, template, left, top, right, bottom)
+
+    best_score = -1.0
+    for i, (first_x, first_y, first) in enumerate(patches[:ANCHOR_LOCATORS]):
+        # The patch is searched for wherever the template itself could be in the window
+        window = (left + first_x, top + first_y, right - template.w + first_x + first.w, bottom - template.h + first_y + first.h)
+        if scale < 1:
+            score, loc = _pyramid_match_in(frame, first, *window, threshold, scale, gray)
+        else:
+            score, loc = _match_in(frame, first, *window)
+        best_score = max(best_score, score)
+        if score >= threshold:
+            break
+    else:
+        return best_score, None  # None of the locating patches is on screen, neither is the template
+
+    template_left, template_top = loc[0] - first_x, loc[1] - first_y
+    for x, y, patch in patches[:i] + patches[i + 1:]:
+        x, y = template_left + x, template_top + y
+        patch_score, _ = _match_in(frame, patch, x - ANCHOR_MARGIN, y - ANCHOR_MARGIN,
+                                   x + patch.w + ANCHOR_MARGIN, y + patch.h + ANCHOR_MARGIN)
+        score = min(score, patch_score)
+        if score < threshold:
+            return _match_in(frame, template, template_left - ANCHOR_MARGIN, template_top - ANCHOR_MARGIN,
+                             template_left + template.w + ANCHOR_MARGIN, template_top + template.h + ANCHOR_MARGIN)
+    return score, (template_left, template_top)
+
+
+def _anchors(template):
+    """
+    The patches of an anchored template, picked again whenever its mask changes. None while the template is
+    matched whole: until its mask has been learned from enough sightings, or if it has too few distinctive patches.
+    """
+    if not masks.ready(template):
+        return None
+    mask = masks.mask_of(template)
+    cached = _anchor_patches.get(template.name)
+    if cached is None or cached[0] is not template or cached[1] is not mask:
+        patches = _pick_anchors(template, ANCHORS[template.name])
+        if patches is None:
+            log.warning("%s has too few distinctive patches, matching it whole.", template.name)
+        cached = _anchor_patches[template.name] = (template, mask, patches)
+    return cached[2]
+
+
+def _pick_anchors(template, count):
+    """
+    Pick count square patches of a template that have the most contrast, do not look like any other part of it
+    and are spread over it, most contrasted first. Patches cover no pixels left out by the template's mask.
+    Returns [(x, y, patch Template)] with x, y the patch's top-left in the template, or None if fewer than two fit.
+    """
+    size = int(np.clip(min(template.w, template.h) // 4, ANCHOR_MIN_SIZE, ANCHOR_MAX_SIZE))
+    if template.w < size or template.h < size:
+        return None
+    gray = template.gray.astype(np.float32)
+    mask = masks.mask_of(template)
+
+    # Standard deviation of the patch at every top-left position
+    mean = cv2.boxFilter(gray, -1, (size, size), anchor=(0, 0), borderType=cv2.BORDER_CONSTANT)
+    mean_sq = cv2.boxFilter(gray * gray, -1, (size, size), anchor=(0, 0), borderType=cv2.BORDER_CONSTANT)
+    contrast = np.sqrt(np.maximum(mean_sq - mean * mean, 0))[:template.h - size + 1, :template.w - size + 1]
+    if mask is not None:
+        covered = cv2.boxFilter(mask.astype(np.float32) / 255, -1, (size, size), anchor=(0, 0), borderType=cv2.BORDER_CONSTANT)
+        contrast[covered[:template.h - size + 1, :template.w - size + 1] < 0.999] = 0
+
+    spread_w, spread_h = max(size, template.w // count), max(size, template.h // count)
+    patches = []
+    while len(patches) < count:
+        y, x = np.unravel_index(np.argmax(contrast), contrast.shape)
+        if contrast[y, x] <= 0:
+            break
+        crop = template.gray[y:y + size, x:x + size]
+        res = cv2.matchTemplate(template.gray, crop, cv2.TM_CCOEFF_NORMED)
+        res[max(0, y - size // 2):y + size // 2 + 1, max(0, x - size // 2):x + size // 2 + 1] = -1.0
+        if res.max() < ANCHOR_UNIQUE:
+            image = template.bgra[y:y + size, x:x + size].copy()
+            if mask is not None:
+                image[:, :, 3] = mask[y:y + size, x:x + size]
+            patches.append((int(x), int(y), Template(f"{template.name}#{len(patches)}", template.path, image)))
+            contrast[max(0, y - spread_h):y + spread_h, max(0, x - spread_w):x + spread_w] = 0
+        else:
+            contrast[max(0, y - size // 2):y + size // 2 + 1, max(0, x - size // 2):x + size // 2 + 1] = 0
+    return patches if len(patches) >= 2 else None
+
+
+def match_template(frame, template, threshold=0.8):
+    """
+    Find the best match of a template in a BGRA frame, or None if it scores below the threshold.
+    The last known location is searched first, then the template's search region, then the whole frame.
+    With SKIP_UNCHANGED, only the part of the screen that changed since the template was last matched
+    is searched again.
+    """
+    started = time.perf_counter()
+    if not SKIP_UNCHANGED:
+        match = _match_template(frame, template, threshold)
+        log.timing('match', template.name, time.perf_counter() - started, score=match and round(match.score, 4))
+        return match
+
+    current = reference = thumbnail(frame)
+    last = _last_results.get(template.name)
+    if last is None or last[0].shape != current.shape or last[1] != threshold:
+        match = _match_template(frame, template, threshold)
+    else:
+        tiles = changed_tiles(last[0], current)
+        previous_match = last[2]
+        if previous_match:
+            # A button stays found as long as the tiles under it are unchanged
+            left, top = previous_match.x - template.w // 2, previous_match.y - template.h // 2
+            box = tiles[_tile_slice(tiles, frame.shape, left, top, left + template.w, top + template.h)]
+            searched = box.any()
+            match = _match_template(frame, template, threshold) if searched else previous_match
+        else:
+            # A template that was missing can only have appeared where the screen changed
+            bounds = changed_bounds(tiles, frame.shape, template.w, template.h)
+            searched = bounds is not None
+            match = _match_template(frame, template, threshold, bounds) if searched else None
+        if not searched:
+            # Nothing was searched, so keep comparing with the frame that was: changes too small to notice from
+            # one frame to the next (a button fading in) still add up to a change against it
+            reference = last[0]
+
+    _last_results[template.name] = (reference, threshold, match)
+    log.timing('match', template.name, time.perf_counter() - started, score=match and round(match.score, 4))
+    return match
+
+
+def _tile_slice(tiles, frame_shape, left, top, right, bottom):
+    """ Slice of the tile grid covering a rectangle of the frame. """
+    tile_h, tile_w = frame_shape[0] / tiles.shape[0], frame_shape[1] / tiles.shape[1]
+    return (slice(max(0, int(top / tile_h)), int(bottom / tile_h) + 1),
+            slice(max(0, int(left / tile_w)), int(right / tile_w) + 1))
+
+
+def _match_template(frame, template, threshold, bounds=None):
+    """ match_template without the change detection. bounds limits the whole search to part of the frame. """
+    frame_h, frame_w = frame.shape[:2]
+    searches = []
+
+    cached = location_cache.get(frame, template.name)
+    if cached:
+        x, y = cached
+        searches.append((x - CACHE_MARGIN, y - CACHE_MARGIN, x + template.w + CACHE_MARGIN, y + template.h + CACHE_MARGIN))
+
+    region = SEARCH_REGIONS.get(template.name)
+    if region:
+        searches.append((int(region[0] * frame_w), int(region[1] * frame_h), int(region[2] * frame_w), int(region[3] * frame_h)))
+
+    searches.append((0, 0, frame_w, frame_h))
+    scale, gray = MATCH_MODES.get(template.name, (1.0, False))
+
+    if bounds:
+        searches = [(max(left, bounds[0]), max(top, bounds[1]), min(right, bounds[2]), min(bottom, bounds[3]))
+                    for left, top, right, bottom in searches]
+
+    for i, (left, top, right, bottom) in enumerate(searches):
+        search_scale = 1.0 if cached and i == 0 else scale  # The cached window is already small enough to match exactly
+        if template.name in ANCHORS:
+            max_val, max_loc = _anchored_match_in(frame, template, left, top, right, bottom, threshold, search_scale, gray)
+        elif search_scale < 1:
+            max_val, max_loc = _pyramid_match_in(frame, template, left, top, right, bottom, threshold, scale, gray)
+        else:
+            max_val, max_loc = _match_in(frame, template, left, top, right, bottom)
+        if max_val >= threshold:
+            location_cache.put(frame, template.name, *max_loc)
+            if template.name in masks.LEARNED:
+                masks.observe(template, frame[max_loc[1]:max_loc[1] + template.h, max_loc[0]:max_loc[0] + template.w])
+            return Match(max_loc[0] + template.w // 2, max_loc[1] + template.h // 2, max_val)
+    return None
+
+
+def match_templates(frame, image_paths, threshold=0.8):
+    """
+    Match several templates against the same frame.
+    image_paths is either a list of names/paths, or a dict mapping each one to its own threshold.
+    Returns a dict of name/path -> Match (None when not found).
+    """
+    if not isinstance(image_paths, dict):
+        image_paths = dict.fromkeys(image_paths, threshold)
+
+    matches = {}
+    for image_path, image_threshold in image_paths.items():
+        template = get_template(image_path)
+        matches[image_path] = match_template(frame, template, image_threshold) if template is not None else None
+    return matches
+
+
+def match_all(frame, template, threshold=0.8, max_matches=None):
+    """
+    Find every occurrence of a template in a BGRA frame, best first. Peaks are taken from the whole
+    response map at once and overlapping hits are reduced to the best one (non-maximum suppression),
+    so each visible button is returned once. Templates with a pyramid mode are searched coarse to fine.
+    """
+    started = time.perf_counter()
+    scale, gray = MATCH_MODES.get(template.name, (1.0, False))
+    small_template = template.scaled(scale, gray) if scale < 1 else None
+
+    if small_template is not None and min(small_template.shape[:2]) >= PYRAMID_MIN_SIZE:
+        small_h, small_w = small_template.shape[:2]
+        res = cv2.matchTemplate(_frame_level(frame, scale, gray), small_template, cv2.TM_CCOEFF_NORMED)
+
+        # Verify each coarse peak in a small full resolution window, as _pyramid_match_in does for the best one
+        margin = int(1 / scale) + 2
+        scores, xs, ys = [], [], []
+        for _, small_x, small_y in zip(*_peaks(res, threshold - PYRAMID_SLACK, small_w, small_h)):
+            x, y = int(small_x / scale), int(small_y / scale)
+            max_val, max_loc = _match_in(frame, template, x - margin, y - margin,
+                                         x + template.w + margin, y + template.h + margin)
+            if max_val >= threshold:
+                scores.append(max_val)
+                xs.append(max_loc[0])
+                ys.append(max_loc[1])
+        scores, xs, ys = np.array(scores), np.array(xs, dtype=int), np.array(ys, dtype=int)
+    else:
+        res = cv2.matchTemplate(frame, template.bgra, cv2.TM_CCOEFF_NORMED)
+        scores, xs, ys = _peaks(res, threshold, template.w, template.h)
+
+    keep = _suppress(scores, xs, ys, template.w, template.h)[:max_matches]
+    matches = [Match(int(xs[i]) + template.w // 2, int(ys[i]) + template.h // 2, float(scores[i])) for i in keep]
+    log.timing('match all', template.name, time.perf_counter() - started, found=len(matches))
+    return matches
+
+
+def _peaks(res, threshold, w, h):
+    """ Local maxima of a response map at or above threshold, as (scores, xs, ys) arrays. """
+    kernel = np.ones((max(3, h // 2 | 1), max(3, w // 2 | 1)), np.uint8)
+    ys, xs = np.nonzero((res >= threshold) & (res >= cv2.dilate(res, kernel)))
+    return res[ys, xs], xs, ys
+
+
+def _suppress(scores, xs, ys, w, h):
+    """ Indices of the hits that are kept, best first, dropping every hit that overlaps a better one too much. """
+    suppressed = np.zeros(len(scores), bool)
+    keep = []
+    for i in np.argsort(-scores, kind='stable'):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        overlap = np.maximum(0, w - np.abs(xs - xs[i])) * np.maximum(0, h - np.abs(ys - ys[i]))
+        suppressed |= overlap > NMS_OVERLAP * w * h
+    return keep
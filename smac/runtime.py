@@ -0,0 +1,121 @@
+# Author: Kyle Mathias
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import clock, log
+from .matching import match_templates
+
+TARGET_FPS = 15  # Frames the live producer grabs per second at most, one for every frame the flow asks for
+ACTION_TIMEOUT = 5  # Seconds a click may take before it counts as failed
+
+# Blocking work runs on its own threads so the event loop keeps capturing and timing while it waits.
+# mss sessions belong to the thread that opened them, so every capture call goes through one thread.
+# Matching also uses a single thread because the matcher keeps per-frame caches; OpenCV still spreads
+# each match over its own worker threads and releases the GIL while it does.
+_capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='capture')
+_match_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='match')
+_action_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='action')
+
+
+async def in_capture_thread(function, *args):
+    """ Run a capture backend call (including creating the backend) on the capture thread. """
+    return await asyncio.get_running_loop().run_in_executor(_capture_executor, function, *args)
+
+
+async def match(frame, image_paths, threshold=0.8):
+    """ match_templates on the matching thread. """
+    return await asyncio.get_running_loop().run_in_executor(_match_executor, match_templates, frame, image_paths, threshold)
+
+
+async def in_match_thread(function, *args):
+    """ Run any other matcher call on the matching thread, so it never races with match(). """
+    return await asyncio.get_running_loop().run_in_executor(_match_executor, function, *args)
+
+
+async def act(function, *args, timeout=ACTION_TIMEOUT):
+    """ Run an action such as a click on the action thread. Raises asyncio.TimeoutError if it takes too long. """
+    future = asyncio.get_running_loop().run_in_executor(_action_executor, function, *args)
+    return await asyncio.wait_for(future, timeout)
+
+
+class FrameStream:
+    """
+    Frames of a capture backend for coroutines. Live, a producer task on the capture thread grabs one frame
+    for every next(), at most fps times a second, so the flow always gets a frame grabbed after it asked and
+    nothing is captured while it is not asking, e.g. while it waits out a battle. On virtual time (a replay) there is no producer: every next() grabs the frame that was recorded
+    at the current virtual time, or waits (virtually) for the next one if the flow has already seen it.
+    """
+
+    def __init__(self, capture, fps=TARGET_FPS, live=True):
+        self.capture = capture
+        self.fps = fps
+        self.live = live
+        self.left, self.top = capture.left, capture.top
+        self.frame = None  # Frame most recently handed to the flow, i.e. the one its decisions are based on
+        self.grabbed_at = None  # When that frame was grabbed
+        self._latest = None  # (sequence number, frame, grabbed_at) of the newest frame
+        self._seen = 0
+        self._new_frame = None
+        self._wanted = None  # Set when the flow wants another frame
+        self._producer = None
+        self._error = None
+        self._replay_started = None  # clock.now() of the first replayed frame
+
+    async def start(self):
+        if self.live:
+            self._new_frame = asyncio.Event()
+            self._wanted = asyncio.Event()
+            self._producer = asyncio.create_task(self._produce())
+
+    async def stop(self):
+        if self._producer is not None:
+            self._producer.cancel()
+            try:
+                await self._producer
+            except asyncio.CancelledError:
+                pass
+            self._producer = None
+
+    async def _produce(self):
+        interval = 1 / self.fps
+        sequence = 0
+        while True:
+            await self._wanted.wait()
+            self._wanted.clear()
+            started = time.monotonic()
+            try:
+                frame = await in_capture_thread(self.capture.grab)
+            except Exception as e:
+                log.error("Capture failed: %s", e)
+                self._error = e
+                self._new_frame.set()
+                return
+            sequence += 1
+            self._latest = (sequence, frame, clock.now())
+            self._new_frame.set()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def next(self):
+        """ A frame grabbed after this call, live, or the recorded frame for the current time on a replay. """
+        if not self.live:
+            if self._replay_started is None:
+                self._replay_started = clock.now()
+            self.capture.skip_to(clock.now() - self._replay_started)
+            wait = self._replay_started + self.capture.next_at() - clock.now()
+            if wait > 0:
+                await clock.sleep(wait)
+            self.frame = await in_capture_thread(self.capture.grab)
+            self.grabbed_at = clock.now()
+            return self.frame
+
+        if self._latest is not None:
+            self._seen = self._latest[0]  # Any frame grabbed before this call is too old
+        while self._latest is None or self._latest[0] <= self._seen:
+            if self._error is not None:
+                raise self._error
+            self._new_frame.clear()
+            self._wanted.set()
+            await self._new_frame.wait()
+        self._seen, self.frame, self.grabbed_at = self._latest
+        return self.frame
@@ -0,0 +1,101 @@
+# Author: Kyle Mathias
+
+# Plays several tasks on one machine, each whenever it can be played. A task run ends once the game has nothing
+# left for it (no fuel, no ads) and records when that will have refilled in the schedule file; the scheduler then
+# starts whichever task is available, or sleeps until the first one is. Every task runs in a process of its own,
+# so the scheduler itself holds no game, templates or capture session while it waits.
+
+import json
+import multiprocessing
+import os
+import time
+from . import log
+from .watchdog import EXIT_GAVE_UP
+
+SCHEDULE_PATH = os.path.join(os.path.expanduser("~"), ".smac", "schedule.json")  # When each task can be played again
+
+RETRY_DELAY = 10 * 60  # Seconds before a task that crashed, or ended without saying why, is tried again
+
+
+def load_schedule(path):
+    """ Read the schedule file: task name -> {'reason', 'ended', 'resume_at'} of the task's last run. """
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("Could not read schedule %s: %s", path, e)
+        return {}
+
+
+def record(path, task_name, reason, wait):
+    """ Note that a task ended for reason and can be played again in wait seconds. """
+    schedule = load_schedule(path)
+    now = time.time()
+    schedule[task_name] = {'reason': reason, 'ended': round(now), 'resume_at': round(now + (wait or 0))}
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(schedule, f, indent=2)
+    except OSError as e:
+        log.warning("Could not write schedule %s: %s", path, e)
+
+
+def resume_at(schedule, task_name):
+    return schedule.get(task_name, {}).get('resume_at', 0)
+
+
+def next_task(task_names, schedule, now):
+    """
+    The task to run now, or None if none is available. Of the available tasks the one that has been available
+    the longest goes first, so tasks that refill at the same time take turns; ties go to the order given.
+    """
+    ready = [name for name in task_names if resume_at(schedule, name) <= now]
+    return min(ready, key=lambda name: resume_at(schedule, name)) if ready else None
+
+
+def run_task(task_name, events_path=None, log_level=log.INFO, stats_path=None):
+    """ Entry point of a task process: play one task until it is done. """
+    import asyncio
+    from . import app
+    from .tasks import load_task
+    task = load_task(task_name)
+    log.configure(events_path, log_level, task_name)
+    try:
+        asyncio.run(app.run(task, stats_path=stats_path or app.STATS_PATH))
+    finally:
+        log.close()
+
+
+def run_schedule(task_names, target=run_task, path=SCHEDULE_PATH):
+    """
+    Run target(task name) in a new process for whichever task is available, forever, or until every task
+    has given up (EXIT_GAVE_UP).
+    """
+    task_names = list(task_names)
+    while task_names:
+        schedule = load_schedule(path)
+        now = time.time()
+        task_name = next_task(task_names, schedule, now)
+        if task_name is None:
+            task_name = min(task_names, key=lambda name: resume_at(schedule, name))
+            wake_at = resume_at(schedule, task_name)
+            log.info("Nothing to play until %s (%s), sleeping.", time.strftime('%H:%M', time.localtime(wake_at)), task_name)
+            time.sleep(max(1, wake_at - now))
+            continue
+
+        log.info("Starting %s.", task_name)
+        process = multiprocessing.Process(target=target, args=(task_name,), name=task_name)
+        process.start()
+        process.join()
+
+        if process.exitcode == EXIT_GAVE_UP:
+            log.error("%s gave up and needs a look, no longer scheduling it.", task_name)
+            task_names.remove(task_name)
+            continue
+
+        if resume_at(load_schedule(path), task_name) <= time.time():
+            # The run did not record when the task refills, so it crashed or was stopped
+            log.warning("%s ended without finishing (exit code %s), trying again in %ss.", task_name, process.exitcode, RETRY_DELAY)
+            record(path, task_name, f"exit code {process.exitcode}", RETRY_DELAY)
@@ -0,0 +1,176 @@
+# Author: Kyle Mathias
+
+from . import clock, log, runtime
+from .templates import get_template
+from .waiting import poll
+from .watchdog import Durations
+
+
+class State:
+    """
+    A screen of the game. It is on screen when every one of its templates is found, and its handler
+    (a coroutine function) is then awaited with their matches. Once the handler returns, only the
+    states named in transitions are looked for, for up to timeout seconds (less once the usual wait
+    is known), before on_timeout (also awaited) runs and the whole screen is classified again.
+    A handler can return a list of state names to override transitions for that visit.
+    """
+
+    def __init__(self, name, image_paths, handler, transitions=(), timeout=10, on_timeout=None):
+        self.name = name
+        self.image_paths = image_paths if isinstance(image_paths, dict) else dict.fromkeys(image_paths, 0.8)
+        self.handler = handler
+        self.transitions = list(transitions)
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+
+    def __repr__(self):
+        return f"State({self.name!r})"
+
+
+class StateMachine:
+    """
+    Classifies the current screen from a single frame and runs the handler of the state it shows.
+
+    While waiting for the states expected after a handler, popups (dialogs that can cover any screen) are
+    dismissed on the way, and the wait gives up early once it takes far longer than the waits after that state
+    did before (see watchdog.Durations). A screen nothing is recognised on is left with one of the back states
+    before run() gives up on it.
+    """
+
+    def __init__(self, stream, states, unknown_timeout=60, poll_interval=1.0, popups=(), back=(), durations=None):
+        self.stream = stream
+        self.states = self._usable(states)
+        self.popups = self._usable(popups)
+        self.back = self._usable(back)
+        self.by_name = {state.name: state for state in self.states}
+        self.durations = durations if durations is not None else Durations()
+        self.unknown_timeout = unknown_timeout
+        self.poll_interval = poll_interval
+        self.previous = None  # Last state whose handler ran
+        self.entered_at = None  # When the screen of the previous state was detected
+        self.reason = None
+
+    @staticmethod
+    def _usable(states):
+        usable = []
+        for state in states:
+            if all(get_template(image_path) is not None for image_path in state.image_paths):
+                usable.append(state)
+            else:
+                log.warning("State %s disabled, one of its templates is missing.", state.name)
+        return usable
+
+    def stop(self, reason):
+        """ Make run() return reason once the current handler finishes. """
+        self.reason = reason
+
+    async def classify(self, states=None):
+        """ Take the next frame and return (state, matches) for the first of states on it, or (None, None). """
+        states = self.states if states is None else states
+
+        # Match every template once, at the loosest threshold any of the states asks for
+        thresholds = {}
+        for state in states:
+            for image_path, threshold in state.image_paths.items():
+                thresholds[image_path] = min(threshold, thresholds.get(image_path, threshold))
+        matches = await runtime.match(await self.stream.next(), thresholds)
+
+        for state in states:
+            found = {image_path: matches[image_path] for image_path in state.image_paths}
+            if all(match and match.score >= state.image_paths[image_path] for image_path, match in found.items()):
+                return state, found
+        return None, None
+
+    async def wait_for_state(self, states, timeout):
+        """ Poll until one of states is on screen. Returns (state, matches), or (None, None) on timeout. """
+        async for _ in poll(timeout, self.poll_interval):
+            state, matches = await self.classify(states)
+            if state:
+                return state, matches
+        return None, None
+
+    async def wait_for_next(self, expected):
+        """
+        Wait for one of the expected states after the previous one, dismissing popups in the meantime.
+        Returns (state, matches), or (None, None) once the wait took longer than it usually does.
+        """
+        states = [self.by_name[name] for name in expected if name in self.by_name]
+        names = {state.name for state in states}
+        popups = [popup for popup in self.popups if popup.name not in names]
+        # Waits are learned per successor (battle -> speed takes a second, battle -> victory a whole fight),
+        # and the wait lasts as long as the slowest expected successor may take
+        limit = max(self.durations.limit(self._transition(state), self.previous.timeout) for state in states) if states else self.previous.timeout
+        started = clock.now()
+        while True:
+            state, matches = await self.wait_for_state(states + popups, started + limit - clock.now())
+            if state is None:
+                return None, None
+            if state in states:
+                self.durations.add(self._transition(state), clock.now() - started)
+                return state, matches
+            log.warning("Dismissing %s popup while waiting after %s.", state.name, self.previous.name)
+            log.event('watchdog', step='popup', name=state.name, state=self.previous.name)
+            await state.handler(matches)
+
+    async def navigate_back(self):
+        """ Click the first back state on screen. Returns whether there was one. """
+        state, matches = await self.classify(self.back) if self.back else (None, None)
+        if state is None:
+            return False
+        log.warning("Screen not recognised, going back with %s.", state.name)
+        log.event('watchdog', step='back', name=state.name)
+        await state.handler(matches)
+        return True
+
+    async def run(self):
+        """ Run handlers until one of them calls stop() or the screen is unrecognised for too long. """
+        self.reason = None
+        self.previous = None
+        self.entered_at = None
+        expected = []
+
+        while self.reason is None:
+            if expected:
+                state, matches = await self.wait_for_next(expected)
+                if state is None:
+                    log.info("No expected screen after %s: %s", self.previous.name, ', '.join(expected))
+                    log.event('watchdog', step='timeout', state=self.previous.name)
+                    if self.previous.on_timeout:
+                        await self.previous.on_timeout()
+                    expected = []
+                    continue
+            else:
+                # Half the time allowed for an unknown screen is spent before trying to go back from it
+                anywhere = self.states + [popup for popup in self.popups if popup.name not in self.by_name]
+                state, matches = await self.wait_for_state(anywhere, self.unknown_timeout / 2)
+                if state is None:
+                    await self.navigate_back()
+                    state, matches = await self.wait_for_state(anywhere, self.unknown_timeout / 2)
+                if state is None:
+                    log.warning("Screen not recognised for %ss.", self.unknown_timeout)
+                    log.event('watchdog', step='restart', state=self.previous and self.previous.name)
+                    self._leave()
+                    self.durations.save()
+                    return 'stuck'
+
+            log.info("State: %s", state.name)
+            self._leave()
+            log.event('transition', name=state.name, previous=self.previous and self.previous.name)
+            started = self.entered_at = clock.now()
+            transitions = await state.handler(matches)
+            log.timing('handler', state.name, clock.now() - started)
+
+            self.previous = state
+            expected = state.transitions if transitions is None else transitions
+        self._leave()
+        self.durations.save()
+        return self.reason
+
+    def _transition(self, state):
+        return f"{self.previous.name} -> {state.name}"
+
+    def _leave(self):
+        """ Count the time since the last state was entered towards it, including the wait for the next one. """
+        if self.entered_at is not None:
+            log.timing('state', self.previous.name, clock.now() - self.entered_at)
+            self.entered_at = None
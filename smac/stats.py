@@ -0,0 +1,218 @@
+# Author: Kyle Mathias
+
+# Run statistics kept across runs in one SQLite file, and a report on them:
+#
+#     python -m smac.stats [--db ~/.smac/stats.sqlite3] [--task money] [--runs 20]
+#
+# Every run of a task (or of each worker) adds a row to runs, one row to cycles per battle or ad with its outcome
+# (what was reported during it, e.g. victory or abort), how long it took and the seconds spent in each state, and
+# one row to restarts each time the game had to be restarted. Rows are only ever appended.
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+from . import clock, log
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, task TEXT, worker TEXT, started REAL, ended REAL, seconds REAL, reason TEXT
+);
+CREATE TABLE IF NOT EXISTS cycles (
+    run_id INTEGER, at REAL, seconds REAL, label TEXT, outcome TEXT, states TEXT
+);
+CREATE TABLE IF NOT EXISTS restarts (
+    run_id INTEGER, at REAL, reason TEXT
+);
+CREATE INDEX IF NOT EXISTS cycles_run ON cycles (run_id);
+CREATE INDEX IF NOT EXISTS restarts_run ON restarts (run_id);
+"""
+
+# A run is flagged in the report when its throughput is this much below the median of the runs before it
+REGRESSION = 0.1
+
+# Label of the cycle a run ended in, stored by end_run
+UNFINISHED = 'unfinished'
+
+_db = None
+_run_id = None
+_run_started = None  # clock.now() when the run started, cycles and restarts are stored relative to it
+_outcomes = []  # Events reported since the last cycle ended
+
+
+def connect(path):
+    db = sqlite3.connect(path, timeout=30)  # Workers share the file, so wait for each other's writes
+    db.executescript(SCHEMA)
+    return db
+
+
+def start_run(path, task, worker=None):
+    """ Record the start of a run in the store at path. Does nothing without a path. """
+    global _db, _run_id, _run_started
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        _db = connect(path)
+        with _db:
+            _run_id = _db.execute("INSERT INTO runs (task, worker, started) VALUES (?, ?, ?)",
+                                  (task, worker, time.time())).lastrowid
+    except sqlite3.Error as e:
+        log.warning("Could not open the statistics store %s: %s", path, e)
+        _db = None
+    _run_started = clock.now()
+
+
+def outcome(event):
+    """ Note an event reported during the current cycle, e.g. victory. """
+    _outcomes.append(event)
+
+
+def cycle(label, seconds, states):
+    """ Store a finished cycle with the events reported during it and the seconds spent in each state. """
+    result = ','.join(event for event in _outcomes if event != label) or label
+    _outcomes.clear()
+    if _db is None:
+        return
+    _write("INSERT INTO cycles VALUES (?, ?, ?, ?, ?, ?)",
+           (_run_id, round(clock.now() - _run_started, 3), round(seconds, 3), label, result,
+            json.dumps({name: round(state_seconds, 3) for name, state_seconds in states.items()})))
+
+
+def restart(reason):
+    """ Store a restart of the game and why it was needed. """
+    if _db is None:
+        return
+    _write("INSERT INTO restarts VALUES (?, ?, ?)", (_run_id, round(clock.now() - _run_started, 3), reason))
+
+
+def end_run(reason):
+    """
+    Record how the run ended, and store the cycle it ended in as unfinished.
+    Safe to call more than once, only the first reason is kept.
+    """
+    global _db
+    if _db is None:
+        return
+    unfinished = log.open_cycle()
+    if unfinished is not None and unfinished[0] > 0:
+        cycle(UNFINISHED, *unfinished)
+    _write("UPDATE runs SET ended = ?, seconds = ?, reason = ? WHERE id = ?",
+           (time.time(), round(clock.now() - _run_started, 3), reason, _run_id))
+    _db.close()
+    _db = None
+
+
+def _write(statement, values):
+    if _db is None:
+        return
+    try:
+        with _db:
+            _db.execute(statement, values)
+    except sqlite3.Error as e:
+        log.warning("Could not write run statistics: %s", e)
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {'p50': round(float(p50), 1), 'p95': round(float(p95), 1)}
+
+
+def summarize(db, run):
+    """ Rates and percentiles of one run row (id, task, worker, started, seconds, reason). """
+    run_id, task, worker, started, seconds, reason = run
+    cycles = db.execute("SELECT at, seconds, label, outcome, states FROM cycles WHERE run_id = ? ORDER BY at", (run_id,)).fetchall()
+    # The cycle a run ended in counts for the time spent in each state, not as a cycle done or an outcome
+    finished = [cycle_row for cycle_row in cycles if cycle_row[2] != UNFINISHED]
+    restarts = db.execute("SELECT reason FROM restarts WHERE run_id = ?", (run_id,)).fetchall()
+
+    # Durations are on the clock the run used (virtual for a replay). A run that is still going,
+    # or that crashed, lasted at least until its last cycle.
+    hours = (seconds if seconds is not None else (cycles[-1][0] if cycles else 0)) / 3600
+    outcomes = {}
+    for cycle_row in finished:
+        outcomes[cycle_row[3]] = outcomes.get(cycle_row[3], 0) + 1
+    restart_reasons = {}
+    for (restart_reason,) in restarts:
+        restart_reasons[restart_reason] = restart_reasons.get(restart_reason, 0) + 1
+
+    return {'run': run_id, 'task': task, 'worker': worker,
+            'started': time.strftime('%Y-%m-%d %H:%M', time.localtime(started)),
+            'hours': round(hours, 2), 'reason': reason or 'running',
+            'cycles': len(finished), 'per_hour': round(len(finished) / hours, 1) if hours > 0 else None,
+            'outcomes': outcomes, 'restarts': restart_reasons,
+            # Cycles completed between two restarts, e.g. ads watched before a WatchError
+            'cycles_per_restart': round(len(finished) / len(restarts), 1) if restarts else None,
+            'cycle_seconds': percentiles([cycle_row[1] for cycle_row in finished]),
+            'states': _state_shares(cycles)}
+
+
+def _state_shares(cycles):
+    """ Average seconds per cycle spent in each state. """
+    totals = {}
+    for cycle_row in cycles:
+        for name, seconds in json.loads(cycle_row[4]).items():
+            totals[name] = totals.get(name, 0.0) + seconds
+    return {name: round(seconds / len(cycles), 1) for name, seconds in sorted(totals.items(), key=lambda item: -item[1])}
+
+
+def regressions(summaries):
+    """ Runs whose cycles per hour fell more than REGRESSION below the median of the earlier runs of their task. """
+    flagged = []
+    for i, summary in enumerate(summaries):
+        earlier = [s['per_hour'] for s in summaries[:i] if s['task'] == summary['task'] and s['per_hour']]
+        if summary['per_hour'] and earlier and summary['per_hour'] < np.median(earlier) * (1 - REGRESSION):
+            flagged.append((summary, float(np.median(earlier))))
+    return flagged
+
+
+def _number(value, unit=''):
+    """ A value of the report with its unit, or - for one there is no data for. """
+    return '-' if value is None else f"{value}{unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report throughput, outcomes and restarts across clicker runs.")
+    parser.add_argument('--db', default=os.path.join(os.path.expanduser("~"), ".smac", "stats.sqlite3"), help="statistics store to read")
+    parser.add_argument('--task', help="only report runs of this task")
+    parser.add_argument('--runs', type=int, default=20, help="number of most recent runs to report")
+    parser.add_argument('--json', action='store_true', help="print the summaries as JSON")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.db):
+        log.error("No statistics store at %s", args.db)
+        return
+    db = connect(args.db)
+    query = "SELECT id, task, worker, started, seconds, reason FROM runs"
+    query += " WHERE task = ?" if args.task else ""
+    runs = db.execute(query + " ORDER BY id DESC LIMIT ?", ((args.task,) if args.task else ()) + (args.runs,)).fetchall()
+    summaries = [summarize(db, run) for run in reversed(runs)]
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+        return
+
+    for s in summaries:
+        log.info("#%d %s %s%s  %.2fh  %d cycle(s)  %s/h  cycle p50 %s p95 %s  ended: %s",
+                 s['run'], s['started'], s['task'], f"/{s['worker']}" if s['worker'] else '', s['hours'], s['cycles'],
+                 _number(s['per_hour']), _number(s['cycle_seconds']['p50'], 's'), _number(s['cycle_seconds']['p95'], 's'),
+                 s['reason'])
+        if s['outcomes']:
+            log.info("    outcomes: %s", ', '.join(f"{name} {count} ({count / s['cycles']:.0%})" for name, count in sorted(s['outcomes'].items())))
+        if s['restarts']:
+            log.info("    restarts: %s (%s cycle(s) per restart)", ', '.join(f"{name} {count}" for name, count in sorted(s['restarts'].items())),
+                     _number(s['cycles_per_restart']))
+        if s['states']:
+            log.info("    seconds per cycle: %s", ', '.join(f"{name} {seconds}" for name, seconds in s['states'].items()))
+
+    for s, median in regressions(summaries):
+        log.warning("Run #%d made %s cycles/h, more than %d%% below the %.1f/h median of the %s runs before it.",
+                    s['run'], s['per_hour'], REGRESSION * 100, median, s['task'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# Author: Kyle Mathias
+
+import json
+import multiprocessing
+import queue
+import time
+from collections import Counter
+from . import log
+from .watchdog import EXIT_GAVE_UP
+
+RESTART_DELAY = 10  # Seconds before a crashed worker is started again
+REPORT_INTERVAL = 300  # Seconds between throughput reports
+
+
+def load_worker_configs(path):
+    """
+    Read worker configs from a JSON list. Each entry needs a unique "name" and may set "monitor"
+    (mss monitor index), "region" ([left, top, width, height] inside that monitor), "app_path"
+    "events" (JSONL file the worker writes its timing events to), "stats" (statistics store, see smac.stats)
+    and "log_level".
+    """
+    with open(path) as f:
+        configs = json.load(f)
+    names = [config['name'] for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Worker names must be unique: {names}")
+    return configs
+
+
+class Worker:
+    """ One bot worker process and its restart bookkeeping. """
+
+    def __init__(self, config):
+        self.config = config
+        self.name = config['name']
+        self.process = None
+        self.restarts = 0
+        self.restart_at = None
+
+    def start(self, target, args):
+        self.process = multiprocessing.Process(target=target, args=(self.config,) + args, name=self.name, daemon=True)
+        self.process.start()
+        self.restart_at = None
+        log.info("Worker %s started (PID: %d).", self.name, self.process.pid)
+
+
+def supervise(target, configs, registry):
+    """
+    Run target(config, registry, events, click_lock) in one process per worker config, restart the ones that
+    crash, and report what they put on the events queue as (worker name, event) per hour.
+    A worker that exits with code 0 is finished and is not restarted, nor is one that gave up (EXIT_GAVE_UP).
+    """
+    events = multiprocessing.Queue()
+    click_lock = multiprocessing.Lock()  # Workers share one mouse, so clicks are made one at a time
+    args = (registry, events, click_lock)
+
+    workers = [Worker(config) for config in configs]
+    for worker in workers:
+        worker.start(target, args)
+
+    started = time.monotonic()
+    next_report = started + REPORT_INTERVAL
+    totals = Counter()
+    per_worker = Counter()
+
+    while workers:
+        try:
+            name, event = events.get(timeout=1)
+            totals[event] += 1
+            per_worker[name, event] += 1
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        for worker in list(workers):
+            if worker.process.is_alive():
+                continue
+            if worker.restart_at is None:
+                if worker.process.exitcode == 0:
+                    log.info("Worker %s finished.", worker.name)
+                    workers.remove(worker)
+                    continue
+                if worker.process.exitcode == EXIT_GAVE_UP:
+                    log.error("Worker %s gave up and needs a look, not restarting it.", worker.name)
+                    workers.remove(worker)
+                    continue
+                worker.restarts += 1
+                worker.restart_at = now + RESTART_DELAY
+                log.warning("Worker %s crashed (exit code %s), restarting in %ss.", worker.name, worker.process.exitcode, RESTART_DELAY)
+            elif now >= worker.restart_at:
+                worker.start(target, args)
+
+        if now >= next_report:
+            next_report = now + REPORT_INTERVAL
+            report(totals, per_worker, now - started)
+
+    # Count whatever the last workers reported right before they finished
+    while True:
+        try:
+            name, event = events.get(timeout=0.1)
+        except queue.Empty:
+            break
+        totals[event] += 1
+        per_worker[name, event] += 1
+    report(totals, per_worker, time.monotonic() - started)
+
+
+def report(totals, per_worker, elapsed):
+    """ Print event counts and rates per hour, in total and per worker. """
+    hours = max(elapsed, 1) / 3600
+    log.info("--- %.1f minutes ---", elapsed / 60)
+    for event, count in sorted(totals.items()):
+        log.info("%s: %d (%.1f/h)", event, count, count / hours)
+    for (name, event), count in sorted(per_worker.items()):
+        log.info("  %s %s: %d (%.1f/h)", name, event, count, count / hours)
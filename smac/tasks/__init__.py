@@ -0,0 +1,32 @@
+# Author: Kyle Mathias
+
+# Tasks the clicker can run. Each one is a module defining:
+#
+#     NAME                name of the task, used for its files in ~/.smac
+#     DESCRIPTION         one line shown by --help
+#     RESOURCES_DIR       directory with the task's buttons/ and screens/ templates
+#     STATES              the task's screens in priority order, as smac.states.State
+#     POPUPS              dialogs dismissed from any state, as smac.states.State
+#     BACK                buttons that leave an unrecognised screen, as smac.states.State
+#     START_IMAGES        screens that show the game has finished loading
+#     CALIBRATION_IMAGES  screens the game's scale is found from when the templates do not fit it
+#     MATCH_MODES         (scale, image paths) pairs searched on a downscaled grayscale frame
+#     DYNAMIC_IMAGES      large screens matched on their unchanging pixels and from a few patches of them
+#     CYCLE_EVENT         event reported once per cycle (a battle, an ad), for the run summary
+#     DONE_REASONS        reasons to stop the state machine with that end the run instead of restarting the game
+#     REFILL              done reason -> seconds until the task can be played again, for the scheduler
+#     THRESHOLDS          template name -> threshold where it differs from 0.8, for the benchmark
+#
+# Task modules are only imported once selected, so running one task never loads the other.
+
+import importlib
+
+TASKS = {
+    'money': 'smac.tasks.money',
+    'token': 'smac.tasks.token',
+}
+
+
+def load_task(name):
+    """ Import the module of a task by name. """
+    return importlib.import_module(TASKS[name])
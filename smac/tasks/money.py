@@ -0,0 +1,250 @@
+# Author: Kyle Mathias
+
+# Grinds campaign battles on INSANE with the SMAC-MONEY team until the game runs out of fuel.
+
+import os
+from .. import app, log
+from ..app import click, clicker, close_game, coords_of, end_cycle, find_image, report, wait_for_image
+from ..states import State
+from ..templates import get_resource_path
+from ..watchdog import EXIT_GAVE_UP
+from ..waiting import wait_stable
+
+NAME = "money"
+DESCRIPTION = "Super Mechs money clicker"
+DIFFICULTY = "INSANE"
+
+# Define base path for resources using the new helper function
+RESOURCES_DIR = get_resource_path(os.path.join('SM-Money-Clicker', 'src', 'resources'))
+BUTTONS_DIR = os.path.join(RESOURCES_DIR, 'buttons')
+SCREENS_DIR = os.path.join(RESOURCES_DIR, 'screens')
+
+# Define image paths using the helper function
+
+ABORT_IMAGE_PATH = os.path.join(BUTTONS_DIR, "ABORT.png")
+AUTO_IMAGE_PATH = os.path.join(BUTTONS_DIR, "AUTO.png")
+BACK_IMAGE_PATH = os.path.join(BUTTONS_DIR, "BACK.png")
+BATTLE_IMAGE_PATH = os.path.join(BUTTONS_DIR, "BATTLE.png")
+CAMPAIGN_IMAGE_PATH = os.path.join(BUTTONS_DIR, "CAMPAIGN.png")
+CLOSE_IMAGE_PATH = os.path.join(BUTTONS_DIR, "CLOSE.png")
+HARD_IMAGE_PATH = os.path.join(BUTTONS_DIR, "HARD.png")
+INSANE_IMAGE_PATH = os.path.join(BUTTONS_DIR, "INSANE.png")
+OD8_IMAGE_PATH = os.path.join(BUTTONS_DIR, "OD8.png")
+OK_IMAGE_PATH = os.path.join(BUTTONS_DIR, "OK.png")
+OK2_IMAGE_PATH = os.path.join(BUTTONS_DIR, "OK2.png")
+SELECT_IMAGE_PATH = os.path.join(BUTTONS_DIR, "SELECT.png")
+SMAC_MONEY_IMAGE_PATH = os.path.join(BUTTONS_DIR, "SMAC-MONEY.png")
+SPEED_IMAGE_PATH = os.path.join(BUTTONS_DIR, "SPEED.png")
+TEAMS_IMAGE_PATH = os.path.join(BUTTONS_DIR, "TEAMS.png")
+WORKSHOP_IMAGE_PATH = os.path.join(BUTTONS_DIR, "WORKSHOP.png")
+X_IMAGE_PATH = os.path.join(BUTTONS_DIR, "X.png")
+CONTINUE_IMAGE_PATH = os.path.join(BUTTONS_DIR, "CONTINUE.png")
+
+MAIN_SCREEN_IMAGE_PATH = os.path.join(SCREENS_DIR, "MainScreen.png")
+RESTORATION_OF_EARTH_IMAGE_PATH = os.path.join(SCREENS_DIR, "RestorationOfEarth.png")
+VICTORY_IMAGE_PATH = os.path.join(SCREENS_DIR, "Victory.png")
+CLAIM_REWARDS_IMAGE_PATH = os.path.join(SCREENS_DIR, "ClaimRewards.png")
+NOT_ENOUGH_FUEL_IMAGE_PATH = os.path.join(SCREENS_DIR, "NotEnoughFuel.png")
+
+# The game has loaded once it shows a popup or the main screen
+START_IMAGES = [CLOSE_IMAGE_PATH, X_IMAGE_PATH, MAIN_SCREEN_IMAGE_PATH]
+
+# Screens the scale the game is drawn at is found from, when the templates do not match at their own size
+CALIBRATION_IMAGES = [MAIN_SCREEN_IMAGE_PATH, CLOSE_IMAGE_PATH]
+
+# Large screen crops are searched on a quarter scale grayscale frame and buttons on a half scale one.
+# INSANE and HARD stay at full resolution since their strict thresholds are what tells them apart.
+MATCH_MODES = [
+    (0.25, [MAIN_SCREEN_IMAGE_PATH, RESTORATION_OF_EARTH_IMAGE_PATH, VICTORY_IMAGE_PATH,
+            CLAIM_REWARDS_IMAGE_PATH, NOT_ENOUGH_FUEL_IMAGE_PATH]),
+    (0.5, [ABORT_IMAGE_PATH, AUTO_IMAGE_PATH, BACK_IMAGE_PATH, BATTLE_IMAGE_PATH, CAMPAIGN_IMAGE_PATH,
+           CLOSE_IMAGE_PATH, OD8_IMAGE_PATH, OK_IMAGE_PATH, OK2_IMAGE_PATH, SELECT_IMAGE_PATH,
+           SMAC_MONEY_IMAGE_PATH, SPEED_IMAGE_PATH, TEAMS_IMAGE_PATH, WORKSHOP_IMAGE_PATH,
+           X_IMAGE_PATH, CONTINUE_IMAGE_PATH]),
+]
+
+# Large screen crops that also show numbers and animations: only the pixels that stay the same are compared, and
+# each is found from a few small patches of it instead of the whole crop
+DYNAMIC_IMAGES = [MAIN_SCREEN_IMAGE_PATH, RESTORATION_OF_EARTH_IMAGE_PATH, VICTORY_IMAGE_PATH, CLAIM_REWARDS_IMAGE_PATH]
+
+# Thresholds the clicker uses where they differ from 0.8
+THRESHOLDS = {
+    'buttons/insane': 0.95,
+    'buttons/hard': 1.0,
+    'buttons/auto': 0.95,
+}
+
+# A cycle is one battle, from the end of the previous fight to the result of this one, so it is closed by
+# fight_ended rather than by a reported event
+CYCLE_EVENT = None
+
+# The run is over once the game is out of fuel, and the scheduler comes back once enough has refilled
+DONE_REASONS = ('fuel',)
+REFILL = {'fuel': 2 * 60 * 60}
+
+
+async def select_grind_team():
+    """ Select the SMAC-MONEY team in the workshop. Returns False if one of the steps failed. """
+    workshop_coords = await wait_for_image(WORKSHOP_IMAGE_PATH, 5)
+    if not workshop_coords:
+        log.warning("WORKSHOP ERROR.")
+        return False
+    await click(workshop_coords, "WORKSHOP", 2)
+
+    x_coords = await find_image(X_IMAGE_PATH)
+    if x_coords:
+        await click(x_coords, "X", 2)
+
+    teams_coords = await wait_for_image(TEAMS_IMAGE_PATH, 5)
+    if not teams_coords:
+        log.warning("TEAMS ERROR.")
+        return False
+    await click(teams_coords, "TEAMS", 1)
+
+    team_coords = await wait_for_image(SMAC_MONEY_IMAGE_PATH, 5)
+    if not team_coords:
+        log.warning("Closing application. Team SMAC-MONEY does not exist.")
+        await close_game()
+        exit(EXIT_GAVE_UP)
+    await click(team_coords, "SMAC-MONEY", 1)
+
+    select_coords = await wait_for_image(SELECT_IMAGE_PATH, 5)
+    if not select_coords:
+        log.warning("SELECT ERROR.")
+        return False
+    await click(select_coords, "SELECT", 2)
+
+    back_coords = await wait_for_image(BACK_IMAGE_PATH, 5)
+    if not back_coords:
+        log.warning("BACK ERROR.")
+        return False
+    await click(back_coords, "BACK", 2)
+    return True
+
+
+# Set once the grind team has been selected in this run
+team_selected = False
+
+# Set from the first screen of a fight until its result
+fighting = False
+
+
+def fight_started():
+    """ Report the battle once its fight shows up, so a BATTLE click the game refuses for lack of fuel is not counted. """
+    global fighting
+    if not fighting:
+        fighting = True
+        report('battle')
+
+
+def fight_ended(event):
+    """ Report the result of a fight, and its battle if the fight was not seen before, and close the battle's cycle. """
+    global fighting
+    fight_started()
+    fighting = False
+    report(event)
+    end_cycle('battle')
+
+
+async def handle_main_screen(matches):
+    global team_selected
+    await wait_stable(app.stream, 2)  # Wait for the screen to stabilize
+
+    if not team_selected:
+        team_selected = await select_grind_team()
+        if not team_selected:
+            return []  # Work out where we ended up from the screen
+
+    campaign_coords = await wait_for_image(CAMPAIGN_IMAGE_PATH, 5)
+    if not campaign_coords:
+        log.warning("CAMPAIGN button not found.")
+        return []
+    await click(campaign_coords, "CAMPAIGN", 2)
+
+
+async def handle_battle(matches):
+    # Pick the difficulty before starting the battle
+    if DIFFICULTY == "HARD":
+        hard_coords = await find_image(HARD_IMAGE_PATH, 1)
+        if hard_coords:
+            await click(hard_coords, "HARD", 0.5)
+    elif DIFFICULTY == "INSANE":
+        insane_coords = await find_image(INSANE_IMAGE_PATH, 0.95)
+        if insane_coords:
+            await click(insane_coords, "INSANE", 0.5)
+
+    battle_coords = await find_image(BATTLE_IMAGE_PATH)
+    if not battle_coords:
+        return []
+    await click(battle_coords, "BATTLE", 2)
+
+
+async def handle_speed(matches):
+    fight_started()
+    await click(coords_of(matches), "X1 SPEED", 0.5, retry=False)
+
+
+async def handle_auto(matches):
+    fight_started()
+    await click(coords_of(matches), "AUTO OFF", 0.5, retry=False)
+
+
+async def handle_victory(matches):
+    fight_ended('victory')
+    await click(coords_of(matches), "VICTORY", 3)
+
+
+async def handle_abort(matches):
+    fight_ended('abort')
+    await click(coords_of(matches), "ABORT", 3)
+
+
+async def handle_claim_rewards(matches):
+    # The rewards are revealed one click at a time, so keep clicking only until the OK button shows up
+    claim_rewards_coords = coords_of(matches)
+    await click(claim_rewards_coords, "CLAIM REWARDS", 5)
+    for _ in range(2):
+        if await find_image(OK2_IMAGE_PATH):
+            return
+        await click(claim_rewards_coords, "CLAIM REWARDS again", 2)
+
+
+async def handle_not_enough_fuel(matches):
+    log.info("Not Enough Fuel, come back when fuel is enough.")
+    app.machine.stop('fuel')
+
+
+# Battles can run for a long time before Victory or Abort shows up
+BATTLE_TIMEOUT = 30 * 60
+BATTLE_END_STATES = ['not enough fuel', 'speed', 'auto', 'victory', 'abort']
+
+# Screens of the game in priority order: popups and results come before the screens they cover
+STATES = [
+    State('not enough fuel', [NOT_ENOUGH_FUEL_IMAGE_PATH], handle_not_enough_fuel),
+    State('close', [CLOSE_IMAGE_PATH], clicker("CLOSE button", 2)),
+    State('victory', [VICTORY_IMAGE_PATH], handle_victory, ['continue', 'claim rewards']),
+    State('abort', [ABORT_IMAGE_PATH], handle_abort, ['continue', 'x']),
+    State('continue', [CONTINUE_IMAGE_PATH], clicker("CONTINUE", 2)),
+    State('claim rewards', [CLAIM_REWARDS_IMAGE_PATH], handle_claim_rewards, ['ok']),
+    State('ok', [OK2_IMAGE_PATH], clicker("OK", 2), ['x', 'od8']),
+    State('battle', [BATTLE_IMAGE_PATH], handle_battle, BATTLE_END_STATES, BATTLE_TIMEOUT),
+    State('speed', [SPEED_IMAGE_PATH], handle_speed, BATTLE_END_STATES, BATTLE_TIMEOUT),
+    State('auto', {AUTO_IMAGE_PATH: 0.95}, handle_auto, BATTLE_END_STATES, BATTLE_TIMEOUT),
+    State('x', [X_IMAGE_PATH], clicker("X button", 2)),
+    State('od8', [OD8_IMAGE_PATH], clicker("OD8", 1), ['battle'], 5),
+    State('restoration of earth', [RESTORATION_OF_EARTH_IMAGE_PATH], clicker("Restoration of Earth", 2), ['od8'], 5),
+    State('main screen', [MAIN_SCREEN_IMAGE_PATH], handle_main_screen, ['restoration of earth'], 5),
+]
+
+# Dialogs that can cover any screen, e.g. after a disconnect, dismissed wherever they show up
+POPUPS = [
+    State('close', [CLOSE_IMAGE_PATH], clicker("CLOSE button", 2)),
+    State('x', [X_IMAGE_PATH], clicker("X button", 2)),
+    State('ok', [OK2_IMAGE_PATH], clicker("OK", 2)),
+    State('ok popup', [OK_IMAGE_PATH], clicker("OK button", 2)),
+]
+
+# Buttons that leave a screen none of the states recognise
+BACK = [
+    State('back', [BACK_IMAGE_PATH], clicker("BACK", 2)),
+]
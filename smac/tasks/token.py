@@ -0,0 +1,138 @@
+# Author: Kyle Mathias
+
+# Watches the ads in the store for tokens until no WATCH NOW offer is left.
+
+import os
+from .. import app, log
+from ..app import click, clicker, coords_of, find_all, report, wait_for_image
+from ..states import State
+from ..templates import get_resource_path
+from ..waiting import wait_stable
+
+NAME = "token"
+DESCRIPTION = "Super Mechs token clicker"
+
+# Define base path for resources using the new helper function
+RESOURCES_DIR = get_resource_path(os.path.join('SM-Token-Clicker', 'src', 'resources'))
+BUTTONS_DIR = os.path.join(RESOURCES_DIR, 'buttons')
+SCREENS_DIR = os.path.join(RESOURCES_DIR, 'screens')
+
+# Define image paths using the helper function
+CLOSE_IMAGE_PATH = os.path.join(BUTTONS_DIR, "CLOSE.png")
+RIGHT_IMAGE_PATH = os.path.join(BUTTONS_DIR, "RIGHT.png")
+RIGHT_PRESSED_IMAGE_PATH = os.path.join(BUTTONS_DIR, "RIGHT PRESSED.png")
+X_IMAGE_PATH = os.path.join(BUTTONS_DIR, "X.png")
+STORE_IMAGE_PATH = os.path.join(BUTTONS_DIR, "STORE.png")
+MAIN_SCREEN_IMAGE_PATH = os.path.join(SCREENS_DIR, "MainScreen.png")
+WATCH_NOW_IMAGE_PATH = os.path.join(BUTTONS_DIR, "WATCH NOW.png")
+WATCH_ERROR_IMAGE_PATH = os.path.join(SCREENS_DIR, "WatchError.png")
+CLAIM_REWARD_IMAGE_PATH = os.path.join(BUTTONS_DIR, "CLAIM REWARD.png")
+OK_IMAGE_PATH = os.path.join(BUTTONS_DIR, "OK.png")
+
+# The game has loaded once it shows a popup or the main screen
+START_IMAGES = [CLOSE_IMAGE_PATH, X_IMAGE_PATH, MAIN_SCREEN_IMAGE_PATH]
+
+# Screens the scale the game is drawn at is found from, when the templates do not match at their own size
+CALIBRATION_IMAGES = [MAIN_SCREEN_IMAGE_PATH, CLOSE_IMAGE_PATH]
+
+# Large screen crops are searched on a quarter scale grayscale frame and buttons on a half scale one
+MATCH_MODES = [
+    (0.25, [MAIN_SCREEN_IMAGE_PATH, WATCH_ERROR_IMAGE_PATH]),
+    (0.5, [CLOSE_IMAGE_PATH, RIGHT_IMAGE_PATH, RIGHT_PRESSED_IMAGE_PATH, X_IMAGE_PATH, STORE_IMAGE_PATH,
+           WATCH_NOW_IMAGE_PATH, CLAIM_REWARD_IMAGE_PATH, OK_IMAGE_PATH]),
+]
+
+# Large screen crops that also show numbers and animations: only the pixels that stay the same are compared, and
+# each is found from a few small patches of it instead of the whole crop
+DYNAMIC_IMAGES = [MAIN_SCREEN_IMAGE_PATH, WATCH_ERROR_IMAGE_PATH]
+
+# Every template uses the default threshold
+THRESHOLDS = {}
+
+# Reported once per ad, the run summary splits the time between two of them by state
+CYCLE_EVENT = 'reward'
+
+# The run is over once every ad has been watched, and the scheduler comes back once new ones are offered
+DONE_REASONS = ('done',)
+REFILL = {'done': 4 * 60 * 60}
+
+# Number of rewards claimed in this run
+rewards_claimed = 0
+
+
+async def handle_main_screen(matches):
+    await wait_stable(app.stream, 2)  # Wait for the screen to stabilize
+
+    # Click on the specific button to open the store
+    store_button_coords = await wait_for_image(STORE_IMAGE_PATH, 5)
+    if not store_button_coords:
+        log.warning("Closing application due to STORE ERROR.")
+        app.machine.stop('store error')
+        return
+    await click(store_button_coords, "STORE button", 3)
+
+
+async def handle_claim_reward(matches):
+    """Handles the CLAIM REWARD button shown while the ad plays."""
+    claim_reward_coords = coords_of(matches)
+    log.info("CLAIM REWARD button detected. Waiting for up to 16 seconds for the ad to finish...")
+    await wait_stable(app.stream, 16, reference=app.stream.frame, stable_for=2)  # Wait until the ad stops playing
+    await click(claim_reward_coords, "CLAIM REWARD", 2)
+
+
+async def handle_ok(matches):
+    global rewards_claimed
+    await click(coords_of(matches), "OK button", 1)
+
+    if app.machine.previous is None or app.machine.previous.name != 'claim reward':
+        # The ad did not play, the game has to be restarted before trying again
+        log.warning("OK without a CLAIM REWARD. Killing Instance.")
+        app.machine.stop('watch error')
+        return
+
+    rewards_claimed += 1
+    report('reward')
+    log.info("Reward claimed (%d this run).", rewards_claimed)
+
+
+async def handle_watch_now(matches):
+    # Every offer in the store carousel is on the frame the screen was recognised from, so pick the first
+    # one from left to right there instead of whichever scored best
+    offers = sorted(await find_all(WATCH_NOW_IMAGE_PATH))
+    log.info("%d WATCH NOW button(s) visible.", len(offers))
+    await click(offers[0] if offers else coords_of(matches), "WATCH NOW button", 1)
+
+
+async def handle_watch_error():
+    log.warning("Neither CLAIM REWARD nor OK button found. Killing Instance.")
+    app.machine.stop('watch error')
+
+
+async def handle_no_watch_now():
+    log.info("WATCH NOW button not found, exiting...")
+    app.machine.stop('done')
+
+
+STORE_STATES = ['watch now', 'right', 'right pressed']
+
+# Screens of the game in priority order: popups and the ad come before the screens they cover
+STATES = [
+    State('close', [CLOSE_IMAGE_PATH], clicker("CLOSE button", 2)),
+    State('claim reward', [CLAIM_REWARD_IMAGE_PATH], handle_claim_reward, ['ok'], 10),
+    State('ok', [OK_IMAGE_PATH], handle_ok, STORE_STATES, 5, handle_no_watch_now),
+    State('watch now', [WATCH_NOW_IMAGE_PATH], handle_watch_now, ['claim reward', 'ok'], 10, handle_watch_error),
+    State('right', [RIGHT_IMAGE_PATH], clicker("RIGHT button", 2), STORE_STATES, 3, handle_no_watch_now),
+    State('right pressed', [RIGHT_PRESSED_IMAGE_PATH], clicker("RIGHT button", 2), STORE_STATES, 3, handle_no_watch_now),
+    State('x', [X_IMAGE_PATH], clicker("X button", 2)),
+    State('main screen', [MAIN_SCREEN_IMAGE_PATH], handle_main_screen, STORE_STATES, 5, handle_no_watch_now),
+]
+
+# Dialogs that can cover any screen, e.g. after a disconnect, dismissed wherever they show up
+POPUPS = [
+    State('close', [CLOSE_IMAGE_PATH], clicker("CLOSE button", 2)),
+    State('x', [X_IMAGE_PATH], clicker("X button", 2)),
+    State('ok popup', [OK_IMAGE_PATH], clicker("OK button", 1)),
+]
+
+# The store has no back button, an unknown screen is left by restarting the game
+BACK = []
@@ -0,0 +1,149 @@
+# Author: Kyle Mathias
+
+import os
+import sys
+import cv2
+import numpy as np
+from . import log
+from .bundle import load_bundle
+
+
+class Template:
+    """ A decoded template image kept in memory together with its precomputed variants. """
+
+    def __init__(self, name, path, image, arrays=None):
+        self.name = name
+        self.path = path
+        self.image = image  # As loaded with IMREAD_UNCHANGED
+        self.h, self.w = image.shape[:2]
+        self.variants = {}  # Downscaled copies keyed by (scale, gray)
+
+        if arrays is not None:
+            # Everything was precomputed by smac.bundle, downscaled copies are stored as e.g. 'gray@0.5'
+            self.gray, self.bgr, self.bgra, self.mask = arrays['gray'], arrays['bgr'], arrays['bgra'], arrays.get('mask')
+            for key, array in arrays.items():
+                if '@' in key:
+                    kind, scale = key.split('@')
+                    self.variants[(float(scale), kind == 'gray')] = array
+            return
+
+        # Precompute the colour variants once so the matcher never converts on the hot path
+        if image.ndim == 2:
+            self.gray = image
+            self.bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            self.bgra = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+        elif image.shape[2] == 4:
+            self.bgra = image
+            self.bgr = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+            self.gray = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+        else:
+            self.bgr = image
+            self.bgra = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+            self.gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        # Where the template is opaque, or None if it is everywhere
+        alpha = self.bgra[:, :, 3]
+        self.mask = np.where(alpha > 0, 255, 0).astype(np.uint8) if alpha.min() < 255 else None
+
+    def scaled(self, scale, gray=False):
+        """ Return the template downscaled by scale (BGRA, or grayscale if gray), computed once. """
+        key = (scale, gray)
+        if key not in self.variants:
+            image = self.gray if gray else self.bgra
+            self.variants[key] = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return self.variants[key]
+
+    def __repr__(self):
+        return f"Template({self.name!r}, {self.w}x{self.h})"
+
+
+def get_resource_path(relative_path):
+    """ Absolute path of a file shipped with the clickers, relative to the repository root or the PyInstaller bundle. """
+    if getattr(sys, 'frozen', False):  # If running from PyInstaller bundle
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, relative_path)
+
+
+# Registry of decoded templates, keyed by template name (see template_name)
+TEMPLATES = {}
+_resources_dir = None
+_bundled = False
+
+
+def template_name(path, resources_dir=None):
+    """ Turn a resource path such as .../resources/buttons/CLOSE.png into the registry name 'buttons/close'. """
+    resources_dir = resources_dir or _resources_dir
+    if resources_dir and path.lower().endswith('.png'):
+        path = os.path.relpath(os.path.abspath(path), resources_dir)
+    name = os.path.splitext(path)[0]
+    return name.replace(os.sep, '/').lower()
+
+
+def load_templates(resources_dir):
+    """
+    Keep every template under resources_dir in the registry: mapped from its compiled bundle (see smac.bundle)
+    if there is an up to date one, otherwise decoded from the PNGs once.
+    """
+    global _resources_dir, _bundled
+    _resources_dir = resources_dir = os.path.abspath(resources_dir)
+
+    bundled = load_bundle(resources_dir)
+    _bundled = bundled is not None
+    if bundled is not None:
+        TEMPLATES.update(bundled)
+        log.info("Mapped %d templates from the bundle in %s", len(bundled), resources_dir)
+        return TEMPLATES
+
+    for root, _, files in os.walk(resources_dir):
+        for file in files:
+            if file.lower().endswith('.png'):
+                _load(os.path.join(root, file))
+
+    log.info("Loaded %d templates from %s", len(TEMPLATES), resources_dir)
+    return TEMPLATES
+
+
+def install_templates(registry, resources_dir):
+    """
+    Use templates already decoded by another process instead of loading them again. Without a registry they are
+    mapped from the bundle, whose pages every process then shares.
+    """
+    global _resources_dir
+    if registry is None:
+        load_templates(resources_dir)
+        return
+    _resources_dir = os.path.abspath(resources_dir)
+    TEMPLATES.update(registry)
+
+
+def is_bundled():
+    """ Whether the templates were mapped from a bundle rather than decoded in this process. """
+    return _bundled
+
+
+def _load(path):
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        log.warning("Image file could not be decoded: %s", path)
+        return None
+
+    name = template_name(path)
+    template = Template(name, path, image)
+    TEMPLATES[name] = template
+    return template
+
+
+def get_template(name_or_path):
+    """ Return the Template for a registry name or resource path, loading it on first use. """
+    name = template_name(name_or_path)
+    template = TEMPLATES.get(name)
+    if template is not None:
+        return template
+
+    if os.path.isfile(name_or_path):
+        return _load(name_or_path)
+
+    log.warning("Image file not found: %s", name_or_path)
+    return None
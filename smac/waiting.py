@@ -0,0 +1,94 @@
+# Author: Kyle Mathias
+
+from . import clock, log, runtime
+from .changes import THUMBNAIL_SCALE, changed_tiles, frame_difference, thumbnail
+
+MIN_POLL_INTERVAL = 0.05  # First polls come quickly so a fast screen change is caught right away
+POLL_BACKOFF = 1.5  # Each miss stretches the interval until it reaches poll_interval
+
+# Screens are compared on a small grayscale copy; a mean absolute difference below this counts as unchanged
+STABLE_TOLERANCE = 1.0
+
+# Pixels around a clicked button that have to change for the click to count as answered
+CHANGE_RADIUS = 64
+
+
+async def poll(timeout, poll_interval):
+    """ Yield once per poll until timeout (None polls forever), sleeping an adaptive interval between polls. """
+    deadline = None if timeout is None else clock.now() + timeout
+    interval = min(MIN_POLL_INTERVAL, poll_interval)
+    while True:
+        yield
+        remaining = None if deadline is None else deadline - clock.now()
+        if remaining is not None and remaining <= 0:
+            return
+        await clock.sleep(interval if remaining is None else min(interval, remaining))
+        interval = min(interval * POLL_BACKOFF, poll_interval)
+
+
+async def wait_any(stream, image_paths, timeout=10, poll_interval=1.0, threshold=0.8):
+    """
+    Wait until any of the templates is on screen. Earlier entries in image_paths win when several match.
+    Returns (image_path, Match), or (None, None) if none appeared before the timeout.
+    """
+    async for _ in poll(timeout, poll_interval):
+        matches = await runtime.match(await stream.next(), image_paths, threshold)
+        for image_path in image_paths:
+            if matches[image_path]:
+                return image_path, matches[image_path]
+
+    log.debug("Timed out after %ss waiting for %d image(s).", timeout, len(image_paths))
+    return None, None
+
+
+async def wait_for(stream, image_path, timeout=10, poll_interval=1.0, threshold=0.8):
+    """ Wait until a template is on screen. Returns its Match, or None on timeout. """
+    return (await wait_any(stream, [image_path], timeout, poll_interval, threshold))[1]
+
+
+async def wait_change(stream, reference, timeout, around=None, poll_interval=0.25):
+    """
+    Wait until the screen differs from a reference frame (usually the one a click was decided on) in at least
+    one tile, only looking within CHANGE_RADIUS pixels of around=(x, y) if given, e.g. the button that was
+    clicked. Returns the seconds it took, or None if nothing changed there before the timeout.
+    """
+    started = clock.now()
+    reference = _near(thumbnail(reference), around)
+    async for _ in poll(timeout, poll_interval):
+        if changed_tiles(reference, _near(thumbnail(await stream.next()), around)).any():
+            return clock.now() - started
+    return None
+
+
+def _near(small, around):
+    """ The part of a thumbnail within CHANGE_RADIUS frame pixels of around, or all of it. """
+    if around is None:
+        return small
+    x, y, radius = int(around[0] * THUMBNAIL_SCALE), int(around[1] * THUMBNAIL_SCALE), int(CHANGE_RADIUS * THUMBNAIL_SCALE)
+    return small[max(0, y - radius):y + radius, max(0, x - radius):x + radius]
+
+
+async def wait_stable(stream, timeout=2, reference=None, stable_for=0, tolerance=STABLE_TOLERANCE, poll_interval=0.25):
+    """
+    Wait until consecutive frames stop changing for stable_for seconds, for at most timeout seconds.
+    If a reference frame is given (usually the frame a click was decided on), the screen must first
+    change away from it, so a click the game has not reacted to yet is not mistaken for a settled screen.
+    Returns True once the screen is stable, False on timeout.
+    """
+    reference = thumbnail(reference) if reference is not None else None
+    previous = previous_time = quiet_since = None
+
+    async for _ in poll(timeout, poll_interval):
+        now = clock.now()
+        current = thumbnail(await stream.next())
+        if reference is not None:
+            if changed_tiles(reference, current).any():
+                reference = None  # The screen has reacted (a single changed tile is enough), now wait for it to settle
+        elif previous is not None and frame_difference(current, previous) <= tolerance:
+            quiet_since = quiet_since or previous_time
+            if now - quiet_since >= stable_for:
+                return True
+        else:
+            quiet_since = None
+        previous, previous_time = current, now
+    return False
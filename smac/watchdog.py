@@ -0,0 +1,69 @@
+# Author: Kyle Mathias
+
+# How long the game usually takes to move on from each state, learned from earlier waits, so the state machine can
+# tell a slow screen from a stuck one long before the state's fixed timeout runs out. The waits are kept on disk,
+# so a new run starts with what earlier runs learned.
+
+import json
+import os
+import numpy as np
+from . import log
+
+SAMPLES = 50  # Most recent waits kept per state
+MIN_SAMPLES = 10  # Waits needed before the learned limit replaces the state's timeout
+QUANTILE = 99  # The limit is this percentile of the waits...
+SLACK = 2.0  # ...times this...
+MIN_LIMIT = 5.0  # ...but at least this many seconds
+SAVE_EVERY = 20  # Waits added between writes to disk
+
+# Restarts in a row without anything reported before the run gives up and asks for help
+MAX_FAILED_RESTARTS = 3
+
+# Exit code of a run that gave up and needs someone to have a look. Neither the supervisor nor the scheduler
+# start a run that exited with it again.
+EXIT_GAVE_UP = 3
+
+
+class Durations:
+    """
+    The most recent waits for something to happen, in seconds, by name: for the next screen after each state,
+    or for the screen to react to each button. Waits shorter than min_limit are never cut.
+    """
+
+    def __init__(self, path=None, min_limit=MIN_LIMIT):
+        self.path = path
+        self.min_limit = min_limit
+        self.waits = {}
+        self.unsaved = 0
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    self.waits = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("Could not read state durations %s: %s", path, e)
+
+    def limit(self, name, timeout):
+        """ Seconds to wait for name before giving up on it, at most timeout. """
+        waits = self.waits.get(name)
+        if not waits or len(waits) < MIN_SAMPLES:
+            return timeout
+        return min(timeout, max(self.min_limit, float(np.percentile(waits, QUANTILE)) * SLACK))
+
+    def add(self, name, seconds):
+        waits = self.waits.setdefault(name, [])
+        waits.append(round(seconds, 3))
+        del waits[:-SAMPLES]
+        self.unsaved += 1
+        if self.unsaved >= SAVE_EVERY:
+            self.save()
+
+    def save(self):
+        self.unsaved = 0
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(self.waits, f)
+        except OSError as e:
+            log.warning("Could not write state durations %s: %s", self.path, e)